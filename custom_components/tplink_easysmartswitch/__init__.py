@@ -1,24 +1,94 @@
 """TP-Link Easy Smart Switch integration."""
+from array import array
 import asyncio
+from collections.abc import Awaitable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
 from datetime import timedelta
+from functools import partial
 import logging
+import multiprocessing
+import time
+from typing import Any
 
-from homeassistant.config_entries import ConfigEntry
+from homeassistant.config_entries import SOURCE_INTEGRATION_DISCOVERY, ConfigEntry
 from homeassistant.const import (
     CONF_HOST,
     CONF_PASSWORD,
     CONF_SCAN_INTERVAL,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import Event, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
+from homeassistant.helpers import discovery_flow
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+import voluptuous as vol
 
-from .const import CONTROLLER, COORDINATOR, DOMAIN, PLATFORMS, UNDO_UPDATE_LISTENER
+from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_COUNTER_HISTORY,
+    CONF_DEDICATED_CONNECTION,
+    CONF_EXTRA_PAGES,
+    CONF_KEEPALIVE_TIMEOUT,
+    CONF_LINK_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
+    CONF_PARSE_EXECUTOR,
+    CONF_PROTOCOL_KEY,
+    CONF_RATE_SMOOTHING,
+    CONF_TRANSPORT,
+    CONTROLLER,
+    COORDINATOR,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_COUNTER_HISTORY,
+    DEFAULT_DEDICATED_CONNECTION,
+    DEFAULT_KEEPALIVE_TIMEOUT,
+    DEFAULT_LINK_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_PARSE_EXECUTOR,
+    DEFAULT_PARSE_PROCESSES,
+    DEFAULT_RATE_SMOOTHING,
+    DEFAULT_TRANSPORT,
+    DEVICE_INFO,
+    DOMAIN,
+    EVENT_LINK_CHANGED,
+    HISTORY,
+    HISTORY_SAVE_DELAY,
+    HISTORY_STORE,
+    IDENTITY_SAVE_DELAY,
+    PARSE_EXECUTOR_EVENT_LOOP,
+    PARSE_EXECUTOR_PROCESS,
+    PLATFORMS,
+    POLLER,
+    PORTS_UP,
+    PROCESS_POOL,
+    PROTOCOL_KEY,
+    RATES,
+    STORAGE_PORT_NUMBER,
+    STORAGE_PORTS_UP,
+    STORAGE_VERSION,
+    TRANSPORT_HTTP,
+    TRANSPORT_UDP,
+    UNDO_POLL,
+    UNDO_UPDATE_LISTENER,
+)
+from .discovery import async_discover
+from .history import CounterHistory
+from .links import LinkTracker
+from .metrics import TpLinkMetricsView
+from .models import LINK_SPEED, LinkStates, SwitchSnapshot, SystemInfo
+from .parser import parse_script_variables
+from .rates import CounterRates
+from .scheduler import AdaptiveInterval, SwitchPoller
+from .services import async_setup_services
 from .tplink import (
     EasySwitch,
     TpLinkSwitchCannotConnectError,
@@ -27,13 +97,47 @@ from .tplink import (
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = vol.Schema(
+    {DOMAIN: vol.Schema({vol.Optional(CONF_PROTOCOL_KEY): cv.string})},
+    extra=vol.ALLOW_EXTRA,
+)
+
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the TP-Link Easy Smart Switch integration."""
     hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN][POLLER] = SwitchPoller(hass)
+    async_setup_services(hass)
+    hass.http.register_view(TpLinkMetricsView(hass))
+
+    if key := config.get(DOMAIN, {}).get(CONF_PROTOCOL_KEY):
+        hass.data[DOMAIN][PROTOCOL_KEY] = key
+        hass.async_create_background_task(
+            _async_discover_switches(hass, key), f"{DOMAIN} discovery"
+        )
     return True
 
 
+async def _async_discover_switches(hass: HomeAssistant, key: str) -> None:
+    """Start a discovery flow for each switch on the network not configured."""
+    try:
+        switches = await async_discover(key.encode())
+    except OSError as err:
+        _LOGGER.warning("Discovery of the switches failed: %s", err)
+        return
+    configured = {
+        entry.data[CONF_HOST] for entry in hass.config_entries.async_entries(DOMAIN)
+    }
+    for switch in switches:
+        if switch.ip_address and switch.ip_address not in configured:
+            discovery_flow.async_create_flow(
+                hass,
+                DOMAIN,
+                context={"source": SOURCE_INTEGRATION_DISCOVERY},
+                data=asdict(switch),
+            )
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up TP-Link Easy Smart Switch from a config entry."""
     config = entry.data
@@ -42,53 +146,257 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     scan_interval = options.get(CONF_SCAN_INTERVAL, config.get(CONF_SCAN_INTERVAL))
     username = options.get(CONF_USERNAME, config.get(CONF_USERNAME))
     password = options.get(CONF_PASSWORD, config.get(CONF_PASSWORD))
+    parse_executor = options.get(CONF_PARSE_EXECUTOR, DEFAULT_PARSE_EXECUTOR)
+    extra_pages = options.get(CONF_EXTRA_PAGES, [])
+    transport = options.get(CONF_TRANSPORT, DEFAULT_TRANSPORT)
+    protocol_key = hass.data[DOMAIN].get(PROTOCOL_KEY)
+    if transport == TRANSPORT_UDP and not protocol_key:
+        _LOGGER.warning(
+            "No protocol_key in configuration.yaml, polling %s over HTTP",
+            config[CONF_HOST],
+        )
+        transport = TRANSPORT_HTTP
 
-    session = async_get_clientsession(hass, False)
+    # A dedicated connection is owned by the switch, kept alive between polls
+    if options.get(CONF_DEDICATED_CONNECTION, DEFAULT_DEDICATED_CONNECTION):
+        session = None
+    else:
+        session = async_get_clientsession(hass, False)
 
     controller = EasySwitch(
         host=config[CONF_HOST],
         user=username,
         password=password,
         session=session,
+        keepalive_timeout=options.get(
+            CONF_KEEPALIVE_TIMEOUT, DEFAULT_KEEPALIVE_TIMEOUT
+        ),
+        transport=transport,
+        protocol_key=(protocol_key or "").encode(),
+        offload_parsing=parse_executor != PARSE_EXECUTOR_EVENT_LOOP,
+        parse_executor=await _async_get_process_pool(hass)
+        if parse_executor == PARSE_EXECUTOR_PROCESS
+        else None,
     )
 
-    try:
-        await controller.login()
-    except TpLinkSwitchInvalidAuthError as error:
-        raise ConfigEntryAuthFailed from error
-    except TpLinkSwitchCannotConnectError as error:
-        raise ConfigEntryNotReady from error
+    store: Store[dict[str, Any]] = Store(
+        hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}"
+    )
+    identity = await store.async_load()
+    # Ports up at the last poll of a previous run, to create the entities of
+    # the ports down disabled
+    cached_ports_up: list[int] | None = (
+        identity.pop(STORAGE_PORTS_UP, None) if identity else None
+    )
+    ports_up = cached_ports_up
+
+    login_duration = 0.0
+    if identity is None:
+        try:
+            login_duration = await _async_timed(controller.login())
+        except TpLinkSwitchInvalidAuthError as error:
+            await controller.close()
+            raise ConfigEntryAuthFailed from error
+        except TpLinkSwitchCannotConnectError as error:
+            await controller.close()
+            raise ConfigEntryNotReady from error
+    else:
+        # Entities are created from the identity cached by a previous run, the
+        # switch is polled in the background (get_data logs in on demand)
+        controller.restore_informations(
+            SystemInfo(
+                identity["mac_address"],
+                identity["firmware_version"],
+                identity["hardware_version"],
+            ),
+            identity[STORAGE_PORT_NUMBER],
+        )
+
+    poller: SwitchPoller = hass.data[DOMAIN][POLLER]
+    rates = CounterRates(
+        smoothing=options.get(CONF_RATE_SMOOTHING, DEFAULT_RATE_SMOOTHING)
+    )
+    adaptive_interval = (
+        AdaptiveInterval(
+            scan_interval,
+            options.get(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL),
+            options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL),
+        )
+        if options.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING)
+        else None
+    )
+
+    history: CounterHistory | None = None
+    history_store: Store[dict[str, Any]] = Store(
+        hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.history"
+    )
+    if options.get(CONF_COUNTER_HISTORY, DEFAULT_COUNTER_HISTORY):
+        history = CounterHistory(controller.port_number or 0)
+        if (history_data := await history_store.async_load()) is not None:
+            history.restore(history_data)
+
+    link_tracker = LinkTracker()
+
+    @callback
+    def _async_link_statuses(link_statuses: array) -> bool:
+        """Fire an event for each link change, return True if any."""
+        changes = link_tracker.update(link_statuses)
+        for change in changes:
+            hass.bus.async_fire(
+                EVENT_LINK_CHANGED,
+                {
+                    "host": controller.host,
+                    "mac_address": controller.mac_address,
+                    "port": change.port,
+                    "type": change.kind,
+                    "link_status": str(change.current),
+                    "previous_link_status": str(change.previous),
+                    "speed": LINK_SPEED.get(change.current, 0),
+                },
+            )
+        return bool(changes)
+
+    def _stored_identity() -> dict[str, Any]:
+        """Return the identity to store, with the ports up."""
+        return {**_identity(controller), STORAGE_PORTS_UP: ports_up}
+
+    @callback
+    def _async_ports_up(snapshot: SwitchSnapshot) -> None:
+        """Store the ports up once they changed."""
+        nonlocal ports_up
+        if (current := snapshot.ports_up()) != ports_up:
+            ports_up = current
+            store.async_delay_save(_stored_identity, IDENTITY_SAVE_DELAY)
 
     async def async_update_data():
         """Fetch data."""
         try:
-            return await controller.get_data()
+            snapshot = await poller.async_poll(
+                entry.entry_id, partial(controller.get_data, *extra_pages)
+            )
         except TpLinkSwitchInvalidAuthError as err:
             raise UpdateFailed(
                 "Authentication error on TP-Link Easy Smart Switch"
             ) from err
         except TpLinkSwitchCannotConnectError as err:
             raise UpdateFailed(f"Failed to communicating with API: {err}") from err
+        _async_link_statuses(snapshot.link_statuses)
+        _async_ports_up(snapshot)
+        rates.update(snapshot)
+        if adaptive_interval:
+            adaptive_interval.update(snapshot, rates.total_rate)
+        if history:
+            if history.update(snapshot):
+                history_store.async_delay_save(history.as_dict, HISTORY_SAVE_DELAY)
+        return snapshot
 
     coordinator = DataUpdateCoordinator(
         hass,
         _LOGGER,
         name=DOMAIN,
         update_method=async_update_data,
-        update_interval=timedelta(seconds=scan_interval),
+        # Refreshes are scheduled by the shared poller
+        update_interval=None,
     )
 
-    await coordinator.async_refresh()
+    if identity is None:
+        try:
+            refresh_duration, informations_duration = await asyncio.gather(
+                _async_timed(coordinator.async_refresh()),
+                _async_timed(controller.update_informations()),
+            )
+        except TpLinkSwitchInvalidAuthError as error:
+            await controller.close()
+            raise ConfigEntryAuthFailed from error
+        except TpLinkSwitchCannotConnectError as error:
+            await controller.close()
+            raise ConfigEntryNotReady from error
 
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
+        if not coordinator.last_update_success:
+            await controller.close()
+            raise ConfigEntryNotReady
+
+        _LOGGER.debug(
+            "Started %s: login %.3fs, statistics %.3fs, system info %.3fs",
+            controller.host,
+            login_duration,
+            refresh_duration,
+            informations_duration,
+        )
+        await store.async_save(_stored_identity())
+    else:
+        entry.async_create_background_task(
+            hass,
+            _async_check_identity(
+                hass, entry, controller, coordinator, store, identity
+            ),
+            f"{DOMAIN} {config[CONF_HOST]} identity check",
+        )
+
+    def _poll_interval() -> timedelta:
+        """Return the scan interval, or the backoff of the open breaker."""
+        interval = (
+            adaptive_interval.interval()
+            if adaptive_interval
+            else timedelta(seconds=scan_interval)
+        )
+        if (retry_in := controller.breaker.retry_in) is not None:
+            return max(interval, timedelta(seconds=retry_in))
+        return interval
 
-    await controller.update_informations()
+    undo_polls = [poller.async_schedule(entry.entry_id, coordinator, _poll_interval)]
+
+    if link_scan_interval := options.get(
+        CONF_LINK_SCAN_INTERVAL, DEFAULT_LINK_SCAN_INTERVAL
+    ):
+
+        async def async_update_links() -> LinkStates:
+            """Poll the links only, refresh everything on a change."""
+            try:
+                links = await poller.async_poll(
+                    f"{entry.entry_id} links", controller.get_link_states
+                )
+            except (
+                TpLinkSwitchInvalidAuthError,
+                TpLinkSwitchCannotConnectError,
+            ) as err:
+                raise UpdateFailed(f"Failed to poll the links: {err}") from err
+            if _async_link_statuses(links.link_statuses):
+                # Through the poller, not to overlap a scheduled refresh
+                await poller.async_refresh(entry.entry_id, coordinator)
+            return links
+
+        link_coordinator = DataUpdateCoordinator(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} links",
+            update_method=async_update_links,
+            update_interval=None,
+        )
+        undo_polls.append(
+            poller.async_schedule(
+                f"{entry.entry_id} links",
+                link_coordinator,
+                lambda: timedelta(seconds=link_scan_interval),
+            )
+        )
+
+    @callback
+    def undo_poll() -> None:
+        """Stop all the polls of the switch."""
+        for undo in undo_polls:
+            undo()
 
     undo_listener = entry.add_update_listener(_async_update_listener)
     hass.data[DOMAIN][entry.entry_id] = {
         CONTROLLER: controller,
         COORDINATOR: coordinator,
+        RATES: rates,
+        DEVICE_INFO: get_device_info(controller),
+        HISTORY: history,
+        HISTORY_STORE: history_store,
+        PORTS_UP: cached_ports_up,
+        UNDO_POLL: undo_poll,
         UNDO_UPDATE_LISTENER: undo_listener,
     }
 
@@ -97,6 +405,102 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def _async_timed(awaitable: Awaitable[Any]) -> float:
+    """Await, return the duration in seconds."""
+    start = time.monotonic()
+    await awaitable
+    return time.monotonic() - start
+
+
+def _identity(controller: EasySwitch) -> dict[str, Any]:
+    """Return the switch identity to store."""
+    return {
+        **asdict(controller.system_info),
+        STORAGE_PORT_NUMBER: controller.port_number,
+    }
+
+
+async def _async_check_identity(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    controller: EasySwitch,
+    coordinator: DataUpdateCoordinator,
+    store: Store[dict[str, Any]],
+    identity: dict[str, Any],
+) -> None:
+    """Refresh a switch started from its cached identity, reload if it changed."""
+    try:
+        refresh_duration, informations_duration = await asyncio.gather(
+            _async_timed(coordinator.async_refresh()),
+            _async_timed(controller.update_informations()),
+        )
+    except (TpLinkSwitchCannotConnectError, TpLinkSwitchInvalidAuthError) as err:
+        _LOGGER.debug("Cannot check identity of %s: %s", controller.host, err)
+        return
+    if not coordinator.last_update_success:
+        return
+    _LOGGER.debug(
+        "Started %s from cache: statistics %.3fs, system info %.3fs",
+        controller.host,
+        refresh_duration,
+        informations_duration,
+    )
+
+    if (current := _identity(controller)) != identity:
+        _LOGGER.info(
+            "Switch %s changed (firmware %s), reloading",
+            controller.host,
+            controller.firmware_version,
+        )
+        await store.async_save(
+            {**current, STORAGE_PORTS_UP: coordinator.data.ports_up()}
+        )
+        hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+
+
+async def _async_get_process_pool(hass: HomeAssistant) -> ProcessPoolExecutor | None:
+    """Return the process pool shared by all switches parsing out of process.
+
+    Return None, parsing in threads, if its workers cannot import the parser.
+    """
+    if PROCESS_POOL not in hass.data[DOMAIN]:
+        hass.data[DOMAIN][PROCESS_POOL] = hass.async_create_task(
+            _async_start_process_pool(hass)
+        )
+    return await hass.data[DOMAIN][PROCESS_POOL]
+
+
+async def _async_start_process_pool(hass: HomeAssistant) -> ProcessPoolExecutor | None:
+    """Start the process pool and check that its workers can parse."""
+    # Forking the multi-threaded Home Assistant process risks deadlocks
+    method = (
+        "forkserver"
+        if "forkserver" in multiprocessing.get_all_start_methods()
+        else "spawn"
+    )
+    pool = ProcessPoolExecutor(
+        max_workers=DEFAULT_PARSE_PROCESSES,
+        mp_context=multiprocessing.get_context(method),
+    )
+    try:
+        # Submitting starts the workers, which imports the integration
+        future = await hass.async_add_executor_job(
+            pool.submit, parse_script_variables, ""
+        )
+        await asyncio.wrap_future(future)
+    except Exception as err:
+        _LOGGER.warning("Parser processes failed to start, parsing in threads: %s", err)
+        pool.shutdown(wait=False, cancel_futures=True)
+        return None
+
+    @callback
+    def _async_shutdown_pool(_event: Event) -> None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_shutdown_pool)
+    return pool
+
+
 async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Handle options update."""
     await hass.config_entries.async_reload(entry.entry_id)
@@ -113,14 +517,27 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
     )
 
+    hass.data[DOMAIN][entry.entry_id][UNDO_POLL]()
     hass.data[DOMAIN][entry.entry_id][UNDO_UPDATE_LISTENER]()
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        controller: EasySwitch = data[CONTROLLER]
+        await controller.close()
+        if (history := data[HISTORY]) is not None:
+            await data[HISTORY_STORE].async_save(history.as_dict())
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached identity and the counter history of a removed switch."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+    await Store(
+        hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.history"
+    ).async_remove()
+
+
 def get_device_info(
     controller: EasySwitch,
 ) -> DeviceInfo:
@@ -5,23 +5,18 @@ from typing import Any
 
 from homeassistant.components.binary_sensor import BinarySensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import slugify
 
-from . import get_device_info
-from .const import (
-    CONTROLLER,
-    COORDINATOR,
-    DOMAIN,
-    TPLINK_PORT_LINK_STATUS,
-    TPLINK_PORT_RX_BAD_PKT,
-    TPLINK_PORT_RX_GOOD_PKT,
-    TPLINK_PORT_STATE,
-    TPLINK_PORT_TX_BAD_PKT,
-    TPLINK_PORT_TX_GOOD_PKT,
+from .const import CONTROLLER, COORDINATOR, DEVICE_INFO, DOMAIN, PORT_METRIC_LINK
+from .entity import (
+    TpLinkSwitchEntity,
+    async_remove_stale_entities,
+    selected_metrics,
+    selected_ports,
 )
+from .models import SwitchSnapshot
 from .tplink import EasySwitch
 
 _LOGGER = logging.getLogger(__name__)
@@ -34,30 +29,34 @@ async def async_setup_entry(
     data = hass.data[DOMAIN][entry.entry_id]
     controller: EasySwitch = data[CONTROLLER]
     coordinator = data[COORDINATOR]
+    device_info = data[DEVICE_INFO]
 
     entities = []
-    ports_count = controller.port_number
-    for port in range(ports_count):
-        entities.append(
-            TpLinkSwitchBinarySensor(controller, coordinator, port_number=port + 1)
-        )
+    if PORT_METRIC_LINK in selected_metrics(entry):
+        for port in selected_ports(entry, controller.port_number):
+            entities.append(
+                TpLinkSwitchBinarySensor(
+                    controller, coordinator, device_info, port_number=port
+                )
+            )
+    async_remove_stale_entities(hass, entry, "binary_sensor", entities)
     if entities:
         async_add_entities(entities)
 
 
-class TpLinkSwitchBinarySensor(CoordinatorEntity, BinarySensorEntity):
+class TpLinkSwitchBinarySensor(TpLinkSwitchEntity, BinarySensorEntity):
     """Representation of a generic TP-Link Easy Smart Switch sensor."""
 
     def __init__(
         self,
         controller,
         coordinator,
+        device_info,
         port_number,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, port_number, device_info, enabled_default=True)
         self.controller = controller
-        self._port_number = port_number
         self._attr_icon = "mdi:switch"
 
         self._attr_name = f"Port {self._port_number:02}"
@@ -72,37 +71,39 @@ class TpLinkSwitchBinarySensor(CoordinatorEntity, BinarySensorEntity):
                 ]
             )
         )
-        self._attr_device_info = get_device_info(self.controller)
+        self._attributes = self._build_attributes()
 
     @property
     def is_on(self) -> bool | None:
         """Return the state."""
-        return (
-            self.coordinator.data[self._port_number][TPLINK_PORT_STATE] == "Enabled"
-            and self.coordinator.data[self._port_number][TPLINK_PORT_LINK_STATUS]
-            != "Link Down"
-        )
+        snapshot: SwitchSnapshot | None = self.coordinator.data
+        if snapshot is None:
+            return None
+        return snapshot.is_up(self._port_number)
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any] | None:
         """Return the state attributes."""
-        if self.coordinator.data:
+        return self._attributes
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Build the state attributes once per update of the port."""
+        if self._has_changed():
+            self._attributes = self._build_attributes()
+        super()._handle_coordinator_update()
+
+    def _build_attributes(self) -> Mapping[str, Any] | None:
+        """Build the state attributes from the coordinator data."""
+        snapshot: SwitchSnapshot | None = self.coordinator.data
+        if snapshot:
+            port = snapshot.port(self._port_number)
             return {
-                "status": self.coordinator.data[self._port_number][TPLINK_PORT_STATE],
-                "link_status": self.coordinator.data[self._port_number][
-                    TPLINK_PORT_LINK_STATUS
-                ],
-                "tx_good_packet": self.coordinator.data[self._port_number][
-                    TPLINK_PORT_TX_GOOD_PKT
-                ],
-                "tx_bad_packet": self.coordinator.data[self._port_number][
-                    TPLINK_PORT_TX_BAD_PKT
-                ],
-                "rx_good_packet": self.coordinator.data[self._port_number][
-                    TPLINK_PORT_RX_GOOD_PKT
-                ],
-                "rx_bad_paquet": self.coordinator.data[self._port_number][
-                    TPLINK_PORT_RX_BAD_PKT
-                ],
+                "status": str(port.state),
+                "link_status": str(port.link_status),
+                "tx_good_packet": port.tx_good,
+                "tx_bad_packet": port.tx_bad,
+                "rx_good_packet": port.rx_good,
+                "rx_bad_paquet": port.rx_bad,
             }
         return None
@@ -0,0 +1,109 @@
+"""Circuit breaker of the TP-Link Easy Smart Switch polls."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import random
+import time
+from typing import Any
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+BREAKER_STATES = [BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN]
+
+# Connection failures in a row opening the breaker
+FAILURE_THRESHOLD = 3
+# Seconds without requests once open, doubled by failed probe
+MIN_BACKOFF = 30.0
+MAX_BACKOFF = 1800.0
+# Random share of the backoff, so dead switches are not probed together
+BACKOFF_JITTER = 0.1
+# Seconds given to the connection probe of a half open breaker
+PROBE_TIMEOUT = 2.0
+
+
+class CircuitBreaker:
+    """Stop requesting an unreachable switch, probing it with a growing backoff.
+
+    Closed, requests go through. After failure_threshold connection failures
+    in a row, the breaker opens: requests fail at once for the backoff. Then
+    it is half open: a single request is allowed, after a quick probe of the
+    connection. Its success closes the breaker, its failure opens it again
+    for twice the backoff.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        min_backoff: float = MIN_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Init a closed breaker."""
+        self._failure_threshold = failure_threshold
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._clock = clock
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.backoff = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self._retry_at = 0.0
+
+    @property
+    def retry_in(self) -> float | None:
+        """Return the seconds before the next request is allowed, if open."""
+        if self.state != BREAKER_OPEN:
+            return None
+        return max(self._retry_at - self._clock(), 0.0)
+
+    def allow(self) -> bool:
+        """Return True if a request may go, half opening once the backoff elapsed."""
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN and self._clock() >= self._retry_at:
+            self.state = BREAKER_HALF_OPEN
+            return True
+        # Open, or half open with the probe request in flight
+        self.rejected += 1
+        return False
+
+    def success(self) -> None:
+        """Record a request answered by the switch."""
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.backoff = 0.0
+
+    def failure(self) -> None:
+        """Record a connection failure."""
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN:
+            self._open(self.backoff * 2)
+        elif self.state == BREAKER_CLOSED and self.failures >= self._failure_threshold:
+            self._open(self._min_backoff)
+
+    def abort(self) -> None:
+        """Record a request cancelled, a half open breaker opens again."""
+        if self.state == BREAKER_HALF_OPEN:
+            self._open(self.backoff)
+
+    def _open(self, backoff: float) -> None:
+        """Reject the requests for backoff seconds, with some jitter."""
+        self.backoff = min(max(backoff, self._min_backoff), self._max_backoff)
+        self.state = BREAKER_OPEN
+        self.opened += 1
+        self._retry_at = self._clock() + self.backoff * random.uniform(
+            1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the state and counters."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "backoff": self.backoff,
+            "retry_in": self.retry_in,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
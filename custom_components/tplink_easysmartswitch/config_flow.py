@@ -1,4 +1,8 @@
 """Config flow to configure the TP-Link Easy Smart Switch integration."""
+from collections.abc import Mapping
+import logging
+from typing import Any
+
 import voluptuous as vol
 
 from homeassistant.config_entries import (
@@ -14,25 +18,81 @@ from homeassistant.const import (
     CONF_SCAN_INTERVAL,
     CONF_USERNAME,
 )
-from homeassistant.core import callback
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.selector import (
+    SelectOptionDict,
+    SelectSelector,
+    SelectSelectorConfig,
+    SelectSelectorMode,
+)
 
-from .const import DEFAULT_SCAN_INTERVAL, DOMAIN
+from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_COUNTER_HISTORY,
+    CONF_DEDICATED_CONNECTION,
+    CONF_EXTRA_PAGES,
+    CONF_KEEPALIVE_TIMEOUT,
+    CONF_LINK_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
+    CONF_PARSE_EXECUTOR,
+    CONF_PORT_METRICS,
+    CONF_PORTS,
+    CONF_RATE_SMOOTHING,
+    CONF_TRANSPORT,
+    CONTROLLER,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_COUNTER_HISTORY,
+    DEFAULT_DEDICATED_CONNECTION,
+    DEFAULT_KEEPALIVE_TIMEOUT,
+    DEFAULT_LINK_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_PARSE_EXECUTOR,
+    DEFAULT_RATE_SMOOTHING,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    PARSE_EXECUTORS,
+    PORT_METRICS,
+    PROTOCOL_KEY,
+    TRANSPORTS,
+)
+from .discovery import DiscoveredSwitch, async_discover
 from .tplink import (
+    PAGE_CABLE_DIAGNOSTICS,
+    PAGE_LOOP_PREVENTION,
+    PAGE_POE,
+    PAGE_PORT_SETTINGS,
+    PAGE_VLAN,
     EasySwitch,
     TpLinkSwitchCannotConnectError,
     TpLinkSwitchInvalidAuthError,
 )
 
-BASE_SCHEMA = vol.Schema(
+_LOGGER = logging.getLogger(__name__)
+
+CREDENTIALS_SCHEMA = vol.Schema(
     {
-        vol.Required(CONF_HOST): str,
         vol.Optional(CONF_USERNAME, default="admin"): str,
         vol.Optional(CONF_PASSWORD): str,
         vol.Required(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): int,
     }
 )
+BASE_SCHEMA = vol.Schema({vol.Required(CONF_HOST): str}).extend(
+    CREDENTIALS_SCHEMA.schema
+)
+
+EXTRA_PAGES = {
+    PAGE_PORT_SETTINGS: "Port settings",
+    PAGE_VLAN: "802.1Q VLAN",
+    PAGE_POE: "PoE",
+    PAGE_LOOP_PREVENTION: "Loop prevention",
+    PAGE_CABLE_DIAGNOSTICS: "Cable diagnostics",
+}
 
 
 @HANDLERS.register(DOMAIN)
@@ -42,12 +102,17 @@ class TpLinkSwitchConfigFlow(ConfigFlow, domain=DOMAIN):
     VERSION = 1
     CONNECTION_CLASS = CONN_CLASS_LOCAL_POLL
 
+    def __init__(self) -> None:
+        """Init the flow."""
+        self._discovered: dict[str, DiscoveredSwitch] = {}
+
     async def async_step_user(self, user_input=None) -> FlowResult:
         """Handle a flow initialized by the user."""
         errors: dict[str, str] = {}
         if user_input is None:
+            self._discovered = await self._async_discover()
             return self.async_show_form(
-                step_id="user", data_schema=BASE_SCHEMA, errors=errors
+                step_id="user", data_schema=self._user_schema(), errors=errors
             )
 
         entry = await self.async_set_unique_id(
@@ -57,30 +122,93 @@ class TpLinkSwitchConfigFlow(ConfigFlow, domain=DOMAIN):
         if entry:
             self._abort_if_unique_id_configured()
 
-        session = async_get_clientsession(self.hass, False)
-
-        switch = EasySwitch(
-            user_input[CONF_HOST],
-            user_input[CONF_USERNAME],
-            user_input[CONF_PASSWORD],
-            session=session,
-        )
-
-        try:
-            await switch.login()
-            await switch.get_data()
+        if (error := await async_validate_input(self.hass, user_input)) is None:
             return self.async_create_entry(
                 title=f"Switch {user_input[CONF_HOST]}",
                 data=user_input,
             )
-        except TpLinkSwitchInvalidAuthError:
-            errors["base"] = "invalid_auth"
-        except TpLinkSwitchCannotConnectError:
-            errors["base"] = "connect_error"
+        errors["base"] = error
         return self.async_show_form(
-            step_id="user", data_schema=BASE_SCHEMA, errors=errors
+            step_id="user", data_schema=self._user_schema(), errors=errors
         )
 
+    async def async_step_integration_discovery(
+        self, discovery_info: dict[str, Any]
+    ) -> FlowResult:
+        """Handle a switch found by the discovery broadcast."""
+        switch = DiscoveredSwitch(**discovery_info)
+        host: str = switch.ip_address  # type: ignore
+        await self.async_set_unique_id("_".join([DOMAIN, host]))
+        self._abort_if_unique_id_configured()
+        self._discovered = {host: switch}
+        self.context["title_placeholders"] = {
+            "name": switch.model or switch.hostname or host,
+            "host": host,
+        }
+        return await self.async_step_discovery_confirm()
+
+    async def async_step_discovery_confirm(self, user_input=None) -> FlowResult:
+        """Set the credentials of a discovered switch."""
+        errors: dict[str, str] = {}
+        host, switch = next(iter(self._discovered.items()))
+        if user_input is not None:
+            user_input = {CONF_HOST: host, **user_input}
+            if (error := await async_validate_input(self.hass, user_input)) is None:
+                return self.async_create_entry(
+                    title=f"Switch {host}",
+                    data=user_input,
+                )
+            errors["base"] = error
+        return self.async_show_form(
+            step_id="discovery_confirm",
+            data_schema=CREDENTIALS_SCHEMA,
+            errors=errors,
+            description_placeholders={
+                "name": switch.model or host,
+                "host": host,
+                "mac_address": switch.mac_address,
+            },
+        )
+
+    async def _async_discover(self) -> dict[str, DiscoveredSwitch]:
+        """Return the switches on the network not configured yet, by address."""
+        if not (key := self.hass.data.get(DOMAIN, {}).get(PROTOCOL_KEY)):
+            return {}
+        try:
+            switches = await async_discover(key.encode())
+        except OSError as err:
+            _LOGGER.debug("Discovery failed: %s", err)
+            return {}
+        configured = {entry.data[CONF_HOST] for entry in self._async_current_entries()}
+        return {
+            switch.ip_address: switch
+            for switch in switches
+            if switch.ip_address and switch.ip_address not in configured
+        }
+
+    def _user_schema(self) -> vol.Schema:
+        """Return the user step schema, offering the discovered switches."""
+        if not self._discovered:
+            return BASE_SCHEMA
+        options = [
+            SelectOptionDict(
+                value=host,
+                label=f"{switch.model or 'Switch'} {switch.mac_address} ({host})",
+            )
+            for host, switch in self._discovered.items()
+        ]
+        return vol.Schema(
+            {
+                vol.Required(CONF_HOST, default=options[0]["value"]): SelectSelector(
+                    SelectSelectorConfig(
+                        options=options,
+                        custom_value=True,
+                        mode=SelectSelectorMode.DROPDOWN,
+                    )
+                )
+            }
+        ).extend(CREDENTIALS_SCHEMA.schema)
+
     @staticmethod
     @callback
     def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
@@ -98,40 +226,155 @@ class TpLinkSwitchOptionsFlowHandler(OptionsFlow):
             config = self.config_entry.data
             options = self.config_entry.options
 
-            scan_interval = options.get(
-                CONF_SCAN_INTERVAL, config.get(CONF_SCAN_INTERVAL)
+            return self.async_show_form(
+                step_id="init",
+                data_schema=self._options_schema({**config, **options}),
+                errors=errors,
             )
-            username = options.get(CONF_USERNAME, config.get(CONF_USERNAME))
-            password = options.get(CONF_PASSWORD, config.get(CONF_PASSWORD))
-
-            options_schema = {
-                vol.Optional(CONF_USERNAME, default=username): str,
-                vol.Optional(CONF_PASSWORD, default=password): str,
-                vol.Required(CONF_SCAN_INTERVAL, default=scan_interval): int,
-            }
 
+        if user_input[CONF_MIN_SCAN_INTERVAL] > user_input[CONF_MAX_SCAN_INTERVAL]:
+            errors["base"] = "invalid_scan_interval_range"
             return self.async_show_form(
-                step_id="init", data_schema=vol.Schema(options_schema), errors=errors
+                step_id="init",
+                data_schema=self._options_schema(user_input),
+                errors=errors,
             )
 
-        session = async_get_clientsession(self.hass, False)
-        switch = EasySwitch(
-            self.config_entry.data[CONF_HOST],
-            user_input[CONF_USERNAME],
-            user_input[CONF_PASSWORD],
-            session=session,
-        )
-        try:
-            await switch.login()
-            await switch.get_data()
+        if CONF_PORTS not in user_input and CONF_PORTS in self.config_entry.options:
+            user_input[CONF_PORTS] = self.config_entry.options[CONF_PORTS]
+
+        if (
+            error := await async_validate_input(
+                self.hass, {CONF_HOST: self.config_entry.data[CONF_HOST], **user_input}
+            )
+        ) is None:
             return self.async_create_entry(
                 title=f"Switch {self.config_entry.data[CONF_HOST]}",
                 data=user_input,
             )
-        except TpLinkSwitchInvalidAuthError:
-            errors["base"] = "invalid_auth"
-        except TpLinkSwitchCannotConnectError:
-            errors["base"] = "connect_error"
+        errors["base"] = error
         return self.async_show_form(
-            step_id="init", data_schema=BASE_SCHEMA, errors=errors
+            step_id="init", data_schema=self._options_schema(user_input), errors=errors
         )
+
+    def _options_schema(self, values: Mapping[str, Any]) -> vol.Schema:
+        """Return the options schema, with values as defaults."""
+        ports = {
+            str(port): f"Port {port:02}" for port in range(1, self._port_count() + 1)
+        }
+        schema = vol.Schema(
+            {
+                vol.Optional(CONF_USERNAME, default=values.get(CONF_USERNAME)): str,
+                vol.Optional(CONF_PASSWORD, default=values.get(CONF_PASSWORD)): str,
+                vol.Required(
+                    CONF_SCAN_INTERVAL, default=values.get(CONF_SCAN_INTERVAL)
+                ): int,
+                vol.Required(
+                    CONF_LINK_SCAN_INTERVAL,
+                    default=values.get(
+                        CONF_LINK_SCAN_INTERVAL, DEFAULT_LINK_SCAN_INTERVAL
+                    ),
+                ): vol.All(int, vol.Range(min=0)),
+                vol.Required(
+                    CONF_ADAPTIVE_POLLING,
+                    default=values.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING),
+                ): bool,
+                vol.Required(
+                    CONF_MIN_SCAN_INTERVAL,
+                    default=values.get(
+                        CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL
+                    ),
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Required(
+                    CONF_MAX_SCAN_INTERVAL,
+                    default=values.get(
+                        CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL
+                    ),
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Optional(
+                    CONF_EXTRA_PAGES, default=values.get(CONF_EXTRA_PAGES, [])
+                ): cv.multi_select(EXTRA_PAGES),
+                vol.Optional(
+                    CONF_PORT_METRICS,
+                    default=values.get(CONF_PORT_METRICS, list(PORT_METRICS)),
+                ): cv.multi_select(PORT_METRICS),
+                vol.Required(
+                    CONF_COUNTER_HISTORY,
+                    default=values.get(CONF_COUNTER_HISTORY, DEFAULT_COUNTER_HISTORY),
+                ): bool,
+                vol.Required(
+                    CONF_DEDICATED_CONNECTION,
+                    default=values.get(
+                        CONF_DEDICATED_CONNECTION, DEFAULT_DEDICATED_CONNECTION
+                    ),
+                ): bool,
+                vol.Required(
+                    CONF_KEEPALIVE_TIMEOUT,
+                    default=values.get(
+                        CONF_KEEPALIVE_TIMEOUT, DEFAULT_KEEPALIVE_TIMEOUT
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=300)),
+                vol.Required(
+                    CONF_PARSE_EXECUTOR,
+                    default=values.get(CONF_PARSE_EXECUTOR, DEFAULT_PARSE_EXECUTOR),
+                ): vol.In(PARSE_EXECUTORS),
+                vol.Required(
+                    CONF_RATE_SMOOTHING,
+                    default=values.get(CONF_RATE_SMOOTHING, DEFAULT_RATE_SMOOTHING),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.05, max=1)),
+            }
+        )
+        if self.hass.data.get(DOMAIN, {}).get(PROTOCOL_KEY):
+            # The UDP protocol needs its key
+            schema = schema.extend(
+                {
+                    vol.Required(
+                        CONF_TRANSPORT,
+                        default=values.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+                    ): vol.In(TRANSPORTS)
+                }
+            )
+        if not ports:
+            # Ports are only known while the switch is loaded
+            return schema
+        return schema.extend(
+            {
+                vol.Optional(
+                    CONF_PORTS, default=values.get(CONF_PORTS, list(ports))
+                ): cv.multi_select(ports)
+            }
+        )
+
+    def _port_count(self) -> int:
+        """Return the number of ports of the switch, if loaded."""
+        data = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if data is None:
+            return 0
+        return data[CONTROLLER].port_number or 0
+
+
+async def async_validate_input(
+    hass: HomeAssistant, user_input: Mapping[str, Any]
+) -> str | None:
+    """Log on the switch and read its system information, return an error key.
+
+    The system information page is the smallest one behind the login.
+    """
+    switch = EasySwitch(
+        user_input[CONF_HOST],
+        user_input[CONF_USERNAME],
+        user_input[CONF_PASSWORD],
+        session=async_get_clientsession(hass, False),
+        transport=user_input.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+        protocol_key=hass.data.get(DOMAIN, {}).get(PROTOCOL_KEY, "").encode(),
+    )
+    try:
+        await switch.login()
+        await switch.update_informations()
+    except TpLinkSwitchInvalidAuthError:
+        return "invalid_auth"
+    except TpLinkSwitchCannotConnectError:
+        return "connect_error"
+    finally:
+        await switch.close()
+    return None
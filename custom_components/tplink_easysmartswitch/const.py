@@ -3,12 +3,93 @@ DOMAIN = "tplink_easysmartswitch"
 
 CONTROLLER = "controller"
 COORDINATOR = "coordinator"
+DEVICE_INFO = "device_info"
+HISTORY = "history"
+HISTORY_STORE = "history_store"
 PLATFORMS = ["binary_sensor", "sensor"]
+POLLER = "poller"
+PORTS_UP = "ports_up"
+PROCESS_POOL = "process_pool"
+PROTOCOL_KEY = "protocol_key"
+RATES = "rates"
+UNDO_POLL = "undo_poll"
 UNDO_UPDATE_LISTENER = "undo_update_listener"
 
+SERVICE_GET_PORT_HISTORY = "get_port_history"
+
+# Key of the UDP management protocol, in configuration.yaml
+CONF_PROTOCOL_KEY = "protocol_key"
+
+STORAGE_VERSION = 1
+STORAGE_PORT_NUMBER = "port_number"
+STORAGE_PORTS_UP = "ports_up"
+# Seconds before the cached identity is saved after the ports up changed
+IDENTITY_SAVE_DELAY = 60
+
 DEFAULT_SCAN_INTERVAL = 30
+DEFAULT_MAX_CONCURRENT_POLLS = 8
+
+CONF_PARSE_EXECUTOR = "parse_executor"
+PARSE_EXECUTOR_EVENT_LOOP = "event_loop"
+PARSE_EXECUTOR_PROCESS = "process"
+PARSE_EXECUTOR_THREAD = "thread"
+PARSE_EXECUTORS = [
+    PARSE_EXECUTOR_THREAD,
+    PARSE_EXECUTOR_PROCESS,
+    PARSE_EXECUTOR_EVENT_LOOP,
+]
+DEFAULT_PARSE_EXECUTOR = PARSE_EXECUTOR_THREAD
+DEFAULT_PARSE_PROCESSES = 2
+
+CONF_RATE_SMOOTHING = "rate_smoothing"
+DEFAULT_RATE_SMOOTHING = 1.0
+
+CONF_EXTRA_PAGES = "extra_pages"
+
+CONF_PORTS = "ports"
+CONF_PORT_METRICS = "port_metrics"
+PORT_METRIC_LINK = "link"
+PORT_METRIC_RX_PACKETS = "rx_packets"
+PORT_METRIC_TX_PACKETS = "tx_packets"
+PORT_METRIC_RX_ERRORS = "rx_errors"
+PORT_METRIC_TX_ERRORS = "tx_errors"
+PORT_METRIC_ERROR_RATIO = "error_ratio"
+PORT_METRIC_UTILISATION = "utilisation"
+PORT_METRICS = {
+    PORT_METRIC_LINK: "Link",
+    PORT_METRIC_RX_PACKETS: "Ingress",
+    PORT_METRIC_TX_PACKETS: "Egress",
+    PORT_METRIC_RX_ERRORS: "Ingress errors",
+    PORT_METRIC_TX_ERRORS: "Egress errors",
+    PORT_METRIC_ERROR_RATIO: "Error ratio",
+    PORT_METRIC_UTILISATION: "Packet rate utilisation",
+}
+
+CONF_COUNTER_HISTORY = "counter_history"
+DEFAULT_COUNTER_HISTORY = False
+HISTORY_SAVE_DELAY = 300
+
+CONF_DEDICATED_CONNECTION = "dedicated_connection"
+CONF_KEEPALIVE_TIMEOUT = "keepalive_timeout"
+DEFAULT_DEDICATED_CONNECTION = False
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+
+CONF_TRANSPORT = "transport"
+TRANSPORT_HTTP = "http"
+TRANSPORT_UDP = "udp"
+TRANSPORTS = [TRANSPORT_HTTP, TRANSPORT_UDP]
+DEFAULT_TRANSPORT = TRANSPORT_HTTP
+
+CONF_LINK_SCAN_INTERVAL = "link_scan_interval"
+DEFAULT_LINK_SCAN_INTERVAL = 0
+EVENT_LINK_CHANGED = f"{DOMAIN}_link_changed"
 
-TIMESTAMP = "timestamp"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+CONF_MIN_SCAN_INTERVAL = "min_scan_interval"
+DEFAULT_ADAPTIVE_POLLING = False
+DEFAULT_MAX_SCAN_INTERVAL = 300
+DEFAULT_MIN_SCAN_INTERVAL = 5
 
 TPLINK_STATUS = {
     "0": "Link Down",
@@ -21,8 +102,6 @@ TPLINK_STATUS = {
 }
 TPLINK_STATE = {"0": "Disabled", "1": "Enabled"}
 
-TPLINK_PORT_STATE = "state"
-TPLINK_PORT_LINK_STATUS = "link_status"
 TPLINK_PORT_TX_GOOD_PKT = "TxGoodPkt"
 TPLINK_PORT_TX_BAD_PKT = "TxBadPkt"
 TPLINK_PORT_RX_GOOD_PKT = "RxGoodPkt"
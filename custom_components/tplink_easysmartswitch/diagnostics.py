@@ -0,0 +1,71 @@
+"""Diagnostics of the TP-Link Easy Smart Switch integration."""
+from __future__ import annotations
+
+from array import array
+from dataclasses import asdict, is_dataclass
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import CONTROLLER, COORDINATOR, DOMAIN, POLLER, RATES
+from .models import SwitchSnapshot
+from .rates import CounterRates
+from .scheduler import SwitchPoller
+from .tplink import EasySwitch
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    controller: EasySwitch = data[CONTROLLER]
+    rates: CounterRates = data[RATES]
+    poller: SwitchPoller = hass.data[DOMAIN][POLLER]
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "switch": {
+            "host": controller.host,
+            "hardware_version": controller.hardware_version,
+            "firmware_version": controller.firmware_version,
+            "port_number": controller.port_number,
+            "transport": controller.transport,
+            "layouts": controller.layouts,
+        },
+        "last_update_success": data[COORDINATOR].last_update_success,
+        "poll_latency": poller.latencies.get(entry.entry_id),
+        "polls": controller.poll_stats.as_dict(),
+        "link_polls": controller.link_poll_stats.as_dict(),
+        "connection": asdict(controller.connection_stats),
+        "breaker": controller.breaker.as_dict(),
+        "total_rate": rates.total_rate,
+        "pages": {
+            name: _page_diagnostics(value) for name, value in controller.pages.items()
+        },
+    }
+
+
+def _page_diagnostics(value: Any) -> Any:
+    """Return the parsed data of a page in a serializable form."""
+    if isinstance(value, SwitchSnapshot):
+        return {
+            "timestamp": value.timestamp.isoformat(),
+            "ports": [
+                asdict(value.port(port)) for port in range(1, value.port_count + 1)
+            ],
+        }
+    if is_dataclass(value):
+        return {
+            key: item.tolist() if isinstance(item, array) else item
+            for key, item in asdict(value).items()
+        }
+    return value
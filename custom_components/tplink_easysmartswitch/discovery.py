@@ -0,0 +1,121 @@
+"""Discovery of the TP-Link Easy Smart Switches on the local network."""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import logging
+import random
+import socket
+import uuid
+
+from .protocol import (
+    HOST_PORT,
+    OP_DISCOVERY,
+    SWITCH_PORT,
+    TLV_FIRMWARE,
+    TLV_HARDWARE,
+    TLV_HOSTNAME,
+    TLV_IP_ADDRESS,
+    TLV_MAC,
+    TLV_MODEL,
+    TLV_PORT_NUMBER,
+    Packet,
+    ProtocolError,
+    decode_int,
+    decode_ip,
+    decode_mac,
+    decode_packet,
+    decode_string,
+    encode_packet,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+BROADCAST_ADDRESS = "255.255.255.255"
+DEFAULT_DISCOVERY_TIMEOUT = 2.0
+
+
+@dataclass(slots=True, frozen=True)
+class DiscoveredSwitch:
+    """A switch answering the discovery broadcast."""
+
+    mac_address: str
+    ip_address: str | None
+    model: str | None
+    hostname: str | None
+    firmware_version: str | None
+    hardware_version: str | None
+    port_number: int | None
+
+    @classmethod
+    def from_packet(cls, packet: Packet) -> DiscoveredSwitch | None:
+        """Build from a discovery answer, None if it has no MAC address."""
+        mac_address = decode_mac(packet.get(TLV_MAC)) or decode_mac(packet.switch_mac)
+        if mac_address is None or mac_address == "00:00:00:00:00:00":
+            return None
+        return cls(
+            mac_address,
+            decode_ip(packet.get(TLV_IP_ADDRESS)),
+            decode_string(packet.get(TLV_MODEL)),
+            decode_string(packet.get(TLV_HOSTNAME)),
+            decode_string(packet.get(TLV_FIRMWARE)),
+            decode_string(packet.get(TLV_HARDWARE)),
+            decode_int(packet.get(TLV_PORT_NUMBER)),
+        )
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Collect the answers to one discovery request."""
+
+    def __init__(self, key: bytes, sequence: int) -> None:
+        self._key = key
+        self._sequence = sequence
+        self.switches: dict[str, DiscoveredSwitch] = {}
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        try:
+            packet = decode_packet(data, self._key)
+        except ProtocolError:
+            _LOGGER.debug("Ignoring undecodable datagram from %s", addr)
+            return
+        if packet.sequence != self._sequence:
+            return
+        # Our own broadcast, without fields, is ignored here
+        if (switch := DiscoveredSwitch.from_packet(packet)) is not None:
+            self.switches[switch.mac_address] = switch
+
+
+async def async_discover(
+    key: bytes,
+    timeout: float = DEFAULT_DISCOVERY_TIMEOUT,
+    target: tuple[str, int] = (BROADCAST_ADDRESS, SWITCH_PORT),
+    listen: tuple[str, int] = ("0.0.0.0", HOST_PORT),
+) -> list[DiscoveredSwitch]:
+    """Broadcast one discovery request, return the switches answering in time.
+
+    Switches broadcast their answers to HOST_PORT, listen must be bound to it
+    to discover real switches.
+    """
+    loop = asyncio.get_running_loop()
+    sequence = random.randrange(1, 0x10000)
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _DiscoveryProtocol(key, sequence),
+        local_addr=listen,
+        allow_broadcast=True,
+        family=socket.AF_INET,
+        reuse_port=hasattr(socket, "SO_REUSEPORT"),
+    )
+    try:
+        transport.sendto(
+            encode_packet(Packet(OP_DISCOVERY, bytes(6), _host_mac(), sequence), key),
+            target,
+        )
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+    return sorted(protocol.switches.values(), key=lambda switch: switch.mac_address)
+
+
+def _host_mac() -> bytes:
+    """Return the MAC address of this host."""
+    return uuid.getnode().to_bytes(6, "big")
@@ -0,0 +1,87 @@
+"""Base entity of the TP-Link Easy Smart Switch integration."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import CONF_PORT_METRICS, CONF_PORTS, PORT_METRICS
+from .models import SwitchSnapshot
+
+
+class TpLinkSwitchEntity(CoordinatorEntity):
+    """Entity of a switch, or of one of its ports, written only on change.
+
+    Entities of a port without link in the first snapshot are disabled by
+    default, unless enabled_default is set.
+    """
+
+    def __init__(
+        self,
+        coordinator,
+        port_number: int | None = None,
+        device_info: DeviceInfo | None = None,
+        enabled_default: bool | None = None,
+    ) -> None:
+        """Initialize the entity."""
+        super().__init__(coordinator)
+        self._port_number = port_number
+        self._written_available: bool | None = None
+        self._attr_device_info = device_info
+        if enabled_default is None and port_number is not None:
+            snapshot: SwitchSnapshot | None = coordinator.data
+            enabled_default = snapshot is None or snapshot.is_up(port_number)
+        if enabled_default is not None:
+            self._attr_entity_registry_enabled_default = enabled_default
+
+    def _has_changed(self) -> bool:
+        """Return True if the last update may have changed the state."""
+        snapshot: SwitchSnapshot | None = self.coordinator.data
+        if snapshot is None or snapshot.changed_ports is None:
+            return True
+        if self._port_number is None:
+            return bool(snapshot.changed_ports)
+        return self._port_number in snapshot.changed_ports
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if availability or the data changed."""
+        available = self.available
+        if available == self._written_available and (
+            not available or not self._has_changed()
+        ):
+            return
+        self._written_available = available
+        super()._handle_coordinator_update()
+
+
+def selected_ports(entry: ConfigEntry, port_count: int | None) -> list[int]:
+    """Return the ports selected in the options, all by default."""
+    ports = range(1, (port_count or 0) + 1)
+    if CONF_PORTS not in entry.options:
+        return list(ports)
+    return [port for port in ports if str(port) in entry.options[CONF_PORTS]]
+
+
+def selected_metrics(entry: ConfigEntry) -> set[str]:
+    """Return the port metrics selected in the options, all by default."""
+    return set(entry.options.get(CONF_PORT_METRICS, PORT_METRICS))
+
+
+@callback
+def async_remove_stale_entities(
+    hass: HomeAssistant, entry: ConfigEntry, domain: str, entities: Iterable[Entity]
+) -> None:
+    """Remove the entities of a platform no longer selected in the options."""
+    registry = er.async_get(hass)
+    unique_ids = {entity.unique_id for entity in entities}
+    for registry_entry in er.async_entries_for_config_entry(registry, entry.entry_id):
+        if (
+            registry_entry.domain == domain
+            and registry_entry.unique_id not in unique_ids
+        ):
+            registry.async_remove(registry_entry.entity_id)
@@ -0,0 +1,237 @@
+"""Long-term counter history of the TP-Link Easy Smart Switches."""
+from __future__ import annotations
+
+from array import array
+import base64
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+import sys
+from typing import Any
+
+from .models import COUNTERS_BY_PORT, SwitchSnapshot
+from .rates import COUNTER_RANGE, counter_deltas
+
+RESOLUTION_MINUTE = "minute"
+RESOLUTION_HOUR = "hour"
+RESOLUTION_DAY = "day"
+
+# Bucket length and default retention of each rollup
+RESOLUTIONS = {
+    RESOLUTION_MINUTE: timedelta(minutes=1),
+    RESOLUTION_HOUR: timedelta(hours=1),
+    RESOLUTION_DAY: timedelta(days=1),
+}
+DEFAULT_RETENTION = {
+    RESOLUTION_MINUTE: timedelta(hours=6),
+    RESOLUTION_HOUR: timedelta(days=31),
+    RESOLUTION_DAY: timedelta(days=730),
+}
+# Rollups saved, once one of their buckets is closed: the minute rollup,
+# short lived, would have the whole history written every minute
+SAVED_RESOLUTIONS = (RESOLUTION_HOUR, RESOLUTION_DAY)
+
+
+class _Rollup:
+    """Ring of buckets holding the counter increases of all ports.
+
+    Bucket starts are epoch seconds, the counters of a bucket are contiguous
+    in a single array. Arrays grow until capacity, then the oldest bucket is
+    overwritten.
+    """
+
+    def __init__(self, seconds: int, capacity: int, width: int) -> None:
+        self.seconds = seconds
+        self.capacity = capacity
+        self.width = width
+        self.starts = array("q")
+        self.deltas = array("Q")
+        # Index of the newest bucket
+        self.head = -1
+
+    def add(self, timestamp: int, deltas: list[int]) -> bool:
+        """Add counter increases to the bucket of timestamp.
+
+        Return True if a new bucket was started, closing the previous one.
+        """
+        start = timestamp - timestamp % self.seconds
+        width = self.width
+        if self.head >= 0 and self.starts[self.head] == start:
+            offset = self.head * width
+            for index, delta in enumerate(deltas):
+                self.deltas[offset + index] += delta
+            return False
+        if self.head >= 0 and start < self.starts[self.head]:
+            # Clock went backwards, keep the buckets ordered
+            return False
+        self.head = (self.head + 1) % self.capacity
+        if len(self.starts) < self.capacity:
+            self.starts.append(start)
+            self.deltas.extend(deltas)
+        else:
+            self.starts[self.head] = start
+            self.deltas[self.head * width : (self.head + 1) * width] = array(
+                "Q", deltas
+            )
+        return True
+
+    def buckets(self) -> Iterator[tuple[int, array]]:
+        """Yield the buckets, oldest first."""
+        count = len(self.starts)
+        first = (self.head + 1) % count if count == self.capacity else 0
+        width = self.width
+        for position in range(count):
+            index = (first + position) % count
+            yield self.starts[index], self.deltas[index * width : (index + 1) * width]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the buckets oldest first, arrays encoded in base64."""
+        starts = array("q")
+        deltas = array("Q")
+        for start, bucket in self.buckets():
+            starts.append(start)
+            deltas.extend(bucket)
+        return {
+            "starts": base64.b64encode(starts.tobytes()).decode(),
+            "deltas": base64.b64encode(deltas.tobytes()).decode(),
+        }
+
+    def restore(self, data: dict[str, Any], swap: bool) -> None:
+        """Restore the buckets saved by as_dict, up to capacity."""
+        starts = array("q", base64.b64decode(data["starts"]))
+        deltas = array("Q", base64.b64decode(data["deltas"]))
+        if swap:
+            starts.byteswap()
+            deltas.byteswap()
+        if len(deltas) != len(starts) * self.width:
+            return
+        kept = min(len(starts), self.capacity)
+        self.starts = starts[len(starts) - kept :]
+        self.deltas = deltas[len(deltas) - kept * self.width :]
+        self.head = kept - 1
+
+
+class CounterHistory:
+    """Counter increases of all ports of a switch, rolled up by minute, hour and day.
+
+    Each snapshot adds its increase since the previous one (see
+    counter_deltas) to the current bucket of every rollup. The history starts
+    over if the number of ports changes. Only the SAVED_RESOLUTIONS rollups
+    are saved.
+    """
+
+    def __init__(
+        self,
+        port_count: int,
+        retention: dict[str, timedelta] | None = None,
+        counter_range: int = COUNTER_RANGE,
+    ) -> None:
+        """Init an empty history."""
+        self._retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self._counter_range = counter_range
+        self._previous: SwitchSnapshot | None = None
+        self._reset(port_count)
+
+    def _reset(self, port_count: int) -> None:
+        """Drop all buckets, sized for port_count ports."""
+        self._port_count = port_count
+        width = port_count * COUNTERS_BY_PORT
+        self._rollups = {
+            resolution: _Rollup(
+                int(length.total_seconds()),
+                max(1, int(self._retention[resolution] / length)),
+                width,
+            )
+            for resolution, length in RESOLUTIONS.items()
+        }
+
+    @property
+    def port_count(self) -> int:
+        """Return the number of ports."""
+        return self._port_count
+
+    def update(self, snapshot: SwitchSnapshot) -> bool:
+        """Add the counter increases since the previous snapshot.
+
+        Return True if the saved history changed: a bucket of a saved rollup
+        was closed, or the history started over.
+        """
+        previous = self._previous
+        self._previous = snapshot
+        if snapshot.port_count != self._port_count:
+            self._reset(snapshot.port_count)
+            return True
+        if (
+            previous is None
+            or previous.port_count != self._port_count
+            or snapshot.timestamp <= previous.timestamp
+        ):
+            return False
+        deltas = counter_deltas(
+            snapshot.counters, previous.counters, self._counter_range
+        )
+        timestamp = int(snapshot.timestamp.timestamp())
+        closed = False
+        for resolution, rollup in self._rollups.items():
+            if rollup.add(timestamp, deltas) and resolution in SAVED_RESOLUTIONS:
+                closed = True
+        return closed
+
+    def query(
+        self,
+        resolution: str,
+        ports: list[int] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> dict[int, list[dict[str, Any]]]:
+        """Return the buckets of the ports overlapping [start, end), oldest first.
+
+        Each bucket holds its start and the increase of the four counters.
+        Unknown ports are ignored, all ports are returned if ports is empty.
+        """
+        rollup = self._rollups[resolution]
+        all_ports = range(1, self._port_count + 1)
+        ports = [port for port in ports if port in all_ports] if ports else all_ports
+        first = start.timestamp() - rollup.seconds if start else None
+        last = end.timestamp() if end else None
+        result: dict[int, list[dict[str, Any]]] = {port: [] for port in ports}
+        for bucket_start, deltas in rollup.buckets():
+            if (first is not None and bucket_start <= first) or (
+                last is not None and bucket_start >= last
+            ):
+                continue
+            time = datetime.fromtimestamp(bucket_start, timezone.utc)
+            for port in ports:
+                offset = (port - 1) * COUNTERS_BY_PORT
+                tx_good, tx_bad, rx_good, rx_bad = deltas[
+                    offset : offset + COUNTERS_BY_PORT
+                ]
+                result[port].append(
+                    {
+                        "start": time,
+                        "tx_good": tx_good,
+                        "tx_bad": tx_bad,
+                        "rx_good": rx_good,
+                        "rx_bad": rx_bad,
+                    }
+                )
+        return result
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the saved rollups in a JSON serializable form."""
+        return {
+            "port_count": self._port_count,
+            "byteorder": sys.byteorder,
+            "rollups": {
+                resolution: self._rollups[resolution].as_dict()
+                for resolution in SAVED_RESOLUTIONS
+            },
+        }
+
+    def restore(self, data: dict[str, Any]) -> None:
+        """Restore a history saved by as_dict, unless the ports changed."""
+        if data.get("port_count") != self._port_count:
+            return
+        swap = data.get("byteorder") != sys.byteorder
+        for resolution, rollup_data in data.get("rollups", {}).items():
+            if resolution in self._rollups:
+                self._rollups[resolution].restore(rollup_data, swap)
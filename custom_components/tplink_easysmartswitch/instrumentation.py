@@ -0,0 +1,102 @@
+"""Poll instrumentation of the TP-Link Easy Smart Switches."""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+import time
+from typing import Any, TypeVar
+
+_T = TypeVar("_T")
+
+# Number of polls kept by switch
+POLL_HISTORY = 100
+
+
+@dataclass(slots=True)
+class PollRecord:
+    """Stage timings in seconds and payload size in bytes of a poll."""
+
+    started: float
+    pages: tuple[str, ...]
+    duration: float = 0.0
+    # Longest page round trip, pages being fetched concurrently
+    request_duration: float = 0.0
+    # Total time spent in the parsers
+    parse_duration: float = 0.0
+    payload_size: int = 0
+    relogins: int = 0
+    timeouts: int = 0
+    error: str | None = None
+
+
+class PollStats:
+    """Ring buffer of the last polls of a switch, with running counters."""
+
+    def __init__(self, size: int = POLL_HISTORY) -> None:
+        """Init the statistics."""
+        self._records: deque[PollRecord] = deque(maxlen=size)
+        self.polls = 0
+        self.failures = 0
+        self.relogins = 0
+        self.timeouts = 0
+
+    @property
+    def last(self) -> PollRecord | None:
+        """Return the last poll."""
+        return self._records[-1] if self._records else None
+
+    @property
+    def records(self) -> list[PollRecord]:
+        """Return the kept polls, oldest first."""
+        return list(self._records)
+
+    def add(self, record: PollRecord) -> None:
+        """Record a finished poll."""
+        self._records.append(record)
+        self.polls += 1
+        self.relogins += record.relogins
+        self.timeouts += record.timeouts
+        if record.error is not None:
+            self.failures += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters, the stage percentiles and the kept polls."""
+        succeeded = [record for record in self._records if record.error is None]
+        return {
+            "polls": self.polls,
+            "failures": self.failures,
+            "relogins": self.relogins,
+            "timeouts": self.timeouts,
+            "stages": {
+                stage: _percentiles([getattr(record, stage) for record in succeeded])
+                for stage in (
+                    "duration",
+                    "request_duration",
+                    "parse_duration",
+                    "payload_size",
+                )
+            },
+            "records": [asdict(record) for record in self._records],
+        }
+
+
+def timed(function: Callable[..., _T], *args: Any) -> tuple[_T, float]:
+    """Call function, return its result and its duration in seconds.
+
+    Module level so that it can run in a process pool.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _percentiles(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "p50": values[(len(values) - 1) // 2],
+        "p95": values[int((len(values) - 1) * 0.95)],
+        "max": values[-1],
+    }
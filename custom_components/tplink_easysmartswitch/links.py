@@ -0,0 +1,53 @@
+"""Link changes of the TP-Link Easy Smart Switch ports."""
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+
+from .models import LINK_SPEED, LinkStatus
+
+LINK_UP = "up"
+LINK_DOWN = "down"
+LINK_SPEED_CHANGED = "speed_changed"
+
+
+@dataclass(slots=True, frozen=True)
+class LinkChange:
+    """Transition of the link of a port."""
+
+    port: int
+    previous: LinkStatus
+    current: LinkStatus
+
+    @property
+    def kind(self) -> str:
+        """Return LINK_UP, LINK_DOWN or LINK_SPEED_CHANGED."""
+        if self.previous not in LINK_SPEED:
+            return LINK_UP
+        if self.current not in LINK_SPEED:
+            return LINK_DOWN
+        return LINK_SPEED_CHANGED
+
+
+class LinkTracker:
+    """Diff the link statuses of successive polls, full or link only."""
+
+    def __init__(self) -> None:
+        """Init the tracker."""
+        self._link_statuses: array | None = None
+
+    def update(self, link_statuses: array) -> list[LinkChange]:
+        """Return the link changes since the previous poll, none on the first."""
+        previous = self._link_statuses
+        self._link_statuses = link_statuses
+        if previous is None or previous == link_statuses:
+            return []
+        if len(previous) != len(link_statuses):
+            return []
+        return [
+            LinkChange(port, LinkStatus(last), LinkStatus(current))
+            for port, (last, current) in enumerate(
+                zip(previous, link_statuses), start=1
+            )
+            if last != current and (last in LINK_SPEED or current in LINK_SPEED)
+        ]
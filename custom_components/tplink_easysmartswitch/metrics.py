@@ -0,0 +1,114 @@
+"""OpenMetrics export of the TP-Link Easy Smart Switch counters."""
+from __future__ import annotations
+
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant
+
+from .const import CONTROLLER, COORDINATOR, DOMAIN
+from .models import COUNTERS_BY_PORT, LINK_SPEED, LinkStatus, SwitchSnapshot
+from .tplink import EasySwitch
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+PREFIX = DOMAIN
+
+# Labels of the counters, in COUNTER_INDEX order
+_COUNTER_LABELS = (
+    'direction="tx",result="good"',
+    'direction="tx",result="bad"',
+    'direction="rx",result="good"',
+    'direction="rx",result="bad"',
+)
+
+# Metric families: name, type, help
+_FAMILIES = (
+    ("up", "gauge", "Whether the last poll of the switch succeeded."),
+    ("poll_duration_seconds", "gauge", "Duration of the last poll of the switch."),
+    ("port_packets", "counter", "Packets counted by the port, wrapping at 2^32."),
+    ("port_enabled", "gauge", "Whether the port is administratively enabled."),
+    ("port_link_up", "gauge", "Whether the port has a link."),
+    ("port_link_speed_mbps", "gauge", "Negotiated speed of the port, 0 if down."),
+    ("port_link_full_duplex", "gauge", "Whether the link of the port is full duplex."),
+)
+
+
+class TpLinkMetricsView(HomeAssistantView):
+    """Serve the counters of all switches in the OpenMetrics text format."""
+
+    url = f"/api/{DOMAIN}/metrics"
+    name = f"api:{DOMAIN}:metrics"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Init the view."""
+        self._hass = hass
+
+    async def get(self, request: web.Request) -> web.Response:
+        """Render the last snapshot of every switch."""
+        return web.Response(
+            body=render_metrics(self._hass).encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+
+def render_metrics(hass: HomeAssistant) -> str:
+    """Render the metrics of all loaded switches in one pass over the entries.
+
+    Samples are collected by family, the format requiring families to be
+    contiguous.
+    """
+    samples: dict[str, list[str]] = {name: [] for name, _, _ in _FAMILIES}
+    for data in hass.data.get(DOMAIN, {}).values():
+        if not isinstance(data, dict) or CONTROLLER not in data:
+            continue
+        controller: EasySwitch = data[CONTROLLER]
+        coordinator = data[COORDINATOR]
+        switch = f'switch="{_escape(controller.host)}"'
+        samples["up"].append(
+            f"{PREFIX}_up{{{switch}}} {int(coordinator.last_update_success)}"
+        )
+        if (record := controller.poll_stats.last) is not None:
+            samples["poll_duration_seconds"].append(
+                f"{PREFIX}_poll_duration_seconds{{{switch}}} {record.duration:.6f}"
+            )
+
+        snapshot: SwitchSnapshot | None = coordinator.data
+        if snapshot is None:
+            continue
+        counters = snapshot.counters
+        for index, (state, link_status) in enumerate(
+            zip(snapshot.states, snapshot.link_statuses)
+        ):
+            labels = f'{switch},port="{index + 1}"'
+            offset = index * COUNTERS_BY_PORT
+            for counter, counter_labels in enumerate(_COUNTER_LABELS):
+                samples["port_packets"].append(
+                    f"{PREFIX}_port_packets_total{{{labels},{counter_labels}}}"
+                    f" {counters[offset + counter]}"
+                )
+            speed = LINK_SPEED.get(link_status, 0)  # type: ignore
+            samples["port_enabled"].append(f"{PREFIX}_port_enabled{{{labels}}} {state}")
+            samples["port_link_up"].append(
+                f"{PREFIX}_port_link_up{{{labels}}} {int(speed > 0)}"
+            )
+            samples["port_link_speed_mbps"].append(
+                f"{PREFIX}_port_link_speed_mbps{{{labels}}} {speed}"
+            )
+            samples["port_link_full_duplex"].append(
+                f"{PREFIX}_port_link_full_duplex{{{labels}}}"
+                f" {int(speed > 0 and link_status != LinkStatus.HALF_10M)}"
+            )
+
+    lines = []
+    for name, metric_type, description in _FAMILIES:
+        lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+        lines.append(f"# HELP {PREFIX}_{name} {description}")
+        lines.extend(samples[name])
+    lines.append("# EOF\n")
+    return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
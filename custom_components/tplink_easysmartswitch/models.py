@@ -0,0 +1,201 @@
+"""Data model of the TP-Link Easy Smart Switch port statistics."""
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from enum import IntEnum
+
+from .const import (
+    TPLINK_PORT_RX_BAD_PKT,
+    TPLINK_PORT_RX_GOOD_PKT,
+    TPLINK_PORT_TX_BAD_PKT,
+    TPLINK_PORT_TX_GOOD_PKT,
+    TPLINK_STATE,
+    TPLINK_STATUS,
+)
+
+COUNTERS_BY_PORT = 4
+COUNTER_INDEX = {
+    TPLINK_PORT_TX_GOOD_PKT: 0,
+    TPLINK_PORT_TX_BAD_PKT: 1,
+    TPLINK_PORT_RX_GOOD_PKT: 2,
+    TPLINK_PORT_RX_BAD_PKT: 3,
+}
+
+
+class PortState(IntEnum):
+    """Administrative state of a port."""
+
+    DISABLED = 0
+    ENABLED = 1
+
+    def __str__(self) -> str:
+        """Return the label used by the switch web UI."""
+        return TPLINK_STATE[str(self.value)]
+
+
+class LinkStatus(IntEnum):
+    """Negotiated link of a port."""
+
+    LINK_DOWN = 0
+    LS_1 = 1
+    HALF_10M = 2
+    FULL_10M = 3
+    LS_4 = 4
+    FULL_100M = 5
+    FULL_1000M = 6
+
+    def __str__(self) -> str:
+        """Return the label used by the switch web UI."""
+        return TPLINK_STATUS[str(self.value)]
+
+
+# Negotiated speed in Mbit/s of the links up
+LINK_SPEED = {
+    LinkStatus.HALF_10M: 10,
+    LinkStatus.FULL_10M: 10,
+    LinkStatus.FULL_100M: 100,
+    LinkStatus.FULL_1000M: 1000,
+}
+
+# Line rate in packets/s with minimum size frames: 64 bytes plus 20 bytes of
+# preamble and inter frame gap, i.e. 672 bits by packet
+LINK_MAX_PACKET_RATE = {
+    status: speed * 1e6 / 672 for status, speed in LINK_SPEED.items()
+}
+
+
+@dataclass(slots=True, frozen=True)
+class LinkStates:
+    """Administrative states and link statuses of all ports, by port index.
+
+    layout is the firmware layout of the page parsed, if any.
+    """
+
+    states: array
+    link_statuses: array
+    layout: str | None = None
+
+
+@dataclass(slots=True, frozen=True)
+class SystemInfo:
+    """Identity of a switch."""
+
+    mac_address: str | None
+    firmware_version: str | None
+    hardware_version: str | None
+
+
+@dataclass(slots=True, frozen=True)
+class PortStats:
+    """Statistics of a single port."""
+
+    state: PortState
+    link_status: LinkStatus
+    tx_good: int
+    tx_bad: int
+    rx_good: int
+    rx_bad: int
+
+    @property
+    def is_up(self) -> bool:
+        """Return True if the port is enabled and linked."""
+        return (
+            self.state is PortState.ENABLED
+            and self.link_status is not LinkStatus.LINK_DOWN
+        )
+
+
+class SwitchSnapshot:
+    """Statistics of all ports of a switch at a given time.
+
+    States and link statuses are stored as byte arrays, counters as a flat
+    unsigned array of COUNTERS_BY_PORT values by port (see COUNTER_INDEX).
+    Ports are numbered from 1. changed_ports holds the ports that changed
+    since the previous snapshot, None if unknown (all ports may have changed).
+    layout is the firmware layout of the page parsed, if any.
+    """
+
+    __slots__ = (
+        "timestamp",
+        "states",
+        "link_statuses",
+        "counters",
+        "changed_ports",
+        "layout",
+    )
+
+    def __init__(
+        self,
+        timestamp: datetime,
+        states: array,
+        link_statuses: array,
+        counters: array,
+    ) -> None:
+        """Init a snapshot."""
+        self.timestamp = timestamp
+        self.states = states
+        self.link_statuses = link_statuses
+        self.counters = counters
+        self.changed_ports: frozenset[int] | None = None
+        self.layout: str | None = None
+
+    @property
+    def port_count(self) -> int:
+        """Return the number of ports."""
+        return len(self.states)
+
+    def state(self, port: int) -> PortState:
+        """Return the state of a port."""
+        return PortState(self.states[port - 1])
+
+    def link_status(self, port: int) -> LinkStatus:
+        """Return the link status of a port."""
+        return LinkStatus(self.link_statuses[port - 1])
+
+    def is_up(self, port: int) -> bool:
+        """Return True if the port is enabled and linked."""
+        return (
+            self.states[port - 1] == PortState.ENABLED
+            and self.link_statuses[port - 1] != LinkStatus.LINK_DOWN
+        )
+
+    def ports_up(self) -> list[int]:
+        """Return the ports enabled and linked."""
+        return [port for port in range(1, self.port_count + 1) if self.is_up(port)]
+
+    def counter(self, port: int, index: int) -> int:
+        """Return one counter of a port, index from COUNTER_INDEX."""
+        return self.counters[(port - 1) * COUNTERS_BY_PORT + index]
+
+    def changes(self, previous: SwitchSnapshot | None) -> frozenset[int] | None:
+        """Return the ports that changed since a previous snapshot."""
+        if previous is None or previous.port_count != self.port_count:
+            return None
+        if (
+            self.counters == previous.counters
+            and self.states == previous.states
+            and self.link_statuses == previous.link_statuses
+        ):
+            return frozenset()
+        changed = set()
+        for index in range(self.port_count):
+            offset = index * COUNTERS_BY_PORT
+            if (
+                self.states[index] != previous.states[index]
+                or self.link_statuses[index] != previous.link_statuses[index]
+                or self.counters[offset : offset + COUNTERS_BY_PORT]
+                != previous.counters[offset : offset + COUNTERS_BY_PORT]
+            ):
+                changed.add(index + 1)
+        return frozenset(changed)
+
+    def port(self, port: int) -> PortStats:
+        """Return all statistics of a port."""
+        offset = (port - 1) * COUNTERS_BY_PORT
+        return PortStats(
+            self.state(port),
+            self.link_status(port),
+            *self.counters[offset : offset + COUNTERS_BY_PORT],
+        )
@@ -0,0 +1,437 @@
+"""Parse the TP-Link Easy Smart Switch web pages and UDP protocol fields."""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+import re
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+from .models import (
+    COUNTERS_BY_PORT,
+    LinkStates,
+    LinkStatus,
+    PortState,
+    SwitchSnapshot,
+    SystemInfo,
+)
+from .protocol import (
+    PORT_STATISTICS,
+    TLV_FIRMWARE,
+    TLV_HARDWARE,
+    TLV_MAC,
+    TLV_PORT_STATISTICS,
+    decode_fields,
+    decode_mac,
+    decode_string,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCRIPT_RE = re.compile(r"<script[^>]*>(.*?)</script>", re.DOTALL | re.IGNORECASE)
+
+# One pass over the script text picks up the variables of a layout
+_ALL_INFO_RE = re.compile(
+    r"var max_port_num = (?P<max_port_num>\d+);"
+    r"|var all_info = \{(?P<all_info>.*?)\};",
+    re.DOTALL,
+)
+_TMP_INFO_RE = re.compile(
+    r"var max_port_num = (?P<max_port_num>\d+);"
+    r'|tmp_info = "(?P<tmp_info>.*?)";'
+    r'|tmp_info2 = "(?P<tmp_info2>.*?)";',
+    re.DOTALL,
+)
+_ARRAY_RE = re.compile(r"(\w+):\[([^\]]*)\]")
+# Script variables: objects of arrays, arrays, strings, numbers
+_VARIABLE_RE = re.compile(
+    r"var\s+(\w+)\s*=\s*"
+    r"(?:\{(?P<object>.*?)\}"
+    r"|new Array\((?P<new_array>.*?)\)"
+    r"|\[(?P<array>.*?)\]"
+    r'|"(?P<string>[^"]*)"'
+    r"|(?P<number>-?\d+))\s*;",
+    re.DOTALL,
+)
+_FIELD_RE = re.compile(
+    r'(\w+):\s*(?:\[(?P<array>[^\]]*)\]|"(?P<string>[^"]*)"|(?P<number>-?\d+))'
+)
+_SYSTEM_INFO_RE = re.compile(r'(macStr|firmwareStr|hardwareStr):\[\s*"([^"]*)"')
+# Login form, or the script sending the browser back to it
+_LOGIN_PAGE_RE = re.compile(
+    r"""action=["']?/?logon\.cgi|location(?:\.href)?\s*=\s*["']/?Logout\.htm""",
+    re.IGNORECASE,
+)
+# BeautifulSoup fallback
+_SOUP_MAX_PORT_NUM_RE = re.compile(r"var (max_port_num) = (.*?);$", re.MULTILINE)
+_SOUP_TMP_INFO_RE = re.compile(r'tmp_info = "(.*?)";$', re.MULTILINE | re.DOTALL)
+_SOUP_TMP_INFO2_RE = re.compile(r'tmp_info2 = "(.*?)";$', re.MULTILINE | re.DOTALL)
+_SOUP_ALL_INFO_RE = re.compile(
+    r"var all_info = {\n?(.*?)\n?};$", re.MULTILINE | re.DOTALL
+)
+_SOUP_ENTRY_RE = re.compile(",?\n+")
+_SOUP_DROP2_RE = re.compile(r"\[(.*),0,0]")
+
+LAYOUT_ALL_INFO = "all_info"
+LAYOUT_TMP_INFO = "tmp_info"
+
+# Port count, and raw states, link statuses and counters of all ports
+RawStatistics = tuple[int, list[str], list[str], list[str]]
+# Port count, and raw states and link statuses of all ports
+RawLinks = tuple[int, list[str], list[str]]
+
+# Errors of a layout parser given a page in another layout
+_LAYOUT_ERRORS = (KeyError, IndexError, ValueError)
+
+
+@dataclass(slots=True, frozen=True)
+class StatisticsLayout:
+    """A firmware layout of PortStatisticsRpm.htm.
+
+    marker is only found in the scripts of the pages in the layout. parse
+    must be a module level function, called with the content of the script
+    blocks, raising KeyError, IndexError or ValueError if the page is not in
+    the layout. parse_links, if any, likewise parses only the states and
+    link statuses. Layouts must be registered when their module is imported,
+    to be known to the parser processes too.
+    """
+
+    marker: str
+    parse: Callable[[str], RawStatistics]
+    parse_links: Callable[[str], RawLinks] | None = None
+
+
+LAYOUTS: dict[str, StatisticsLayout] = {}
+
+
+def register_layout(name: str, layout: StatisticsLayout) -> None:
+    """Register a firmware layout of the port statistics page."""
+    LAYOUTS[name] = layout
+
+
+def extract_scripts(html: str) -> str:
+    """Return the content of all inline script blocks of a page."""
+    return "\n".join(_SCRIPT_RE.findall(html))
+
+
+def is_login_page(html: str) -> bool:
+    """Return True if the switch answered with its login page."""
+    return _LOGIN_PAGE_RE.search(html) is not None
+
+
+def parse_script_variables(html: str) -> dict[str, Any]:
+    """Parse the variables declared by the scripts of any page.
+
+    Objects become dicts, arrays lists with their values kept as strings
+    without quotes.
+    """
+    variables: dict[str, Any] = {}
+    for match in _VARIABLE_RE.finditer(extract_scripts(html)):
+        if (content := match.group("object")) is not None:
+            variables[match.group(1)] = {
+                field.group(1): _script_value(field)
+                for field in _FIELD_RE.finditer(content)
+            }
+        elif (content := match.group("new_array")) is not None:
+            variables[match.group(1)] = _split_array(content)
+        else:
+            variables[match.group(1)] = _script_value(match)
+    return variables
+
+
+def _script_value(match: re.Match) -> Any:
+    """Return the array, string or number matched."""
+    if (content := match.group("array")) is not None:
+        return _split_array(content)
+    if (content := match.group("string")) is not None:
+        return content
+    return int(match.group("number"))
+
+
+def _split_array(content: str) -> list[str]:
+    """Split the values of a script array."""
+    return [value.strip().strip("\"'") for value in content.split(",") if value.strip()]
+
+
+def parse_system_info(html: str) -> SystemInfo:
+    """Parse SystemInfoRpm.htm."""
+    infos = dict(_SYSTEM_INFO_RE.findall(extract_scripts(html)))
+    if "macStr" not in infos:
+        _LOGGER.debug("Fast system info parser failed, using BeautifulSoup")
+        infos = _soup_parse_system_info(html)
+    return SystemInfo(
+        infos.get("macStr"), infos.get("firmwareStr"), infos.get("hardwareStr")
+    )
+
+
+def _soup_parse_system_info(html: str) -> dict[str, str]:
+    """Parse system info with BeautifulSoup, slower but tolerant."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    result = {}
+    infos = str(soup.script.string).split("\n")
+    for idx, element in enumerate(infos):
+        for key in ("macStr", "firmwareStr", "hardwareStr"):
+            if key in element:
+                result[key] = infos[idx + 1].replace('"', "")
+                break
+    return result
+
+
+def parse_port_statistics(
+    html: str, timestamp: datetime, layout: str | None = None
+) -> SwitchSnapshot:
+    """Parse PortStatisticsRpm.htm into a snapshot taken at timestamp.
+
+    layout is the one of the previous page of the switch, detected again
+    only if the page is not in it. The layout parsed is set on the snapshot.
+    """
+    layout, raw = _parse_statistics(html, layout)
+    snapshot = build_snapshot(timestamp, *raw)
+    snapshot.layout = layout
+    return snapshot
+
+
+def parse_link_states(html: str, layout: str | None = None) -> LinkStates:
+    """Parse only the port states and link statuses of PortStatisticsRpm.htm."""
+    layout, raw = _parse_statistics(html, layout, links=True)
+    port_number, states, link_statuses = raw[:3]
+    return LinkStates(*_port_arrays(port_number, states, link_statuses), layout)
+
+
+def _parse_statistics(
+    html: str, layout: str | None, links: bool = False
+) -> tuple[str, Any]:
+    """Parse statistics in the given layout, else in the one detected.
+
+    If links, only the raw links are parsed by the layouts able to.
+    """
+    scripts = extract_scripts(html)
+    if layout in LAYOUTS:
+        try:
+            return layout, _layout_parser(LAYOUTS[layout], links)(scripts)  # type: ignore
+        except _LAYOUT_ERRORS as err:
+            _LOGGER.debug("Page no longer in the %s layout (%s)", layout, err)
+    for name, candidate in LAYOUTS.items():
+        if name == layout or candidate.marker not in scripts:
+            continue
+        try:
+            return name, _layout_parser(candidate, links)(scripts)
+        except _LAYOUT_ERRORS as err:
+            _LOGGER.debug("Page not in the %s layout (%s)", name, err)
+    _LOGGER.debug("No statistics layout matched, using BeautifulSoup")
+    return _soup_parse_port_statistics(html)
+
+
+def _layout_parser(layout: StatisticsLayout, links: bool) -> Callable[[str], Any]:
+    """Return the parser of the links of a layout if links, else of everything."""
+    if links and layout.parse_links is not None:
+        return layout.parse_links
+    return layout.parse
+
+
+def parse_all_info(scripts: str) -> RawStatistics:
+    """Parse statistics of the layout with one all_info object of arrays."""
+    found = _find_variables(_ALL_INFO_RE, scripts)
+    port_number = int(found["max_port_num"])
+    arrays = {
+        key: values.split(",") for key, values in _ARRAY_RE.findall(found["all_info"])
+    }
+    return _checked(port_number, arrays["state"], arrays["link_status"], arrays["pkts"])
+
+
+def parse_tmp_info(scripts: str) -> RawStatistics:
+    """Parse statistics of the layout with the tmp_info and tmp_info2 strings."""
+    found = _find_variables(_TMP_INFO_RE, scripts)
+    port_number = int(found["max_port_num"])
+    # One flat list of 6 values by port: state, link status and 4 counters
+    cells = found["tmp_info"].split() + found["tmp_info2"].split()
+    pkts = [
+        value
+        for port in range(port_number)
+        for value in cells[port * 6 + 2 : port * 6 + 6]
+    ]
+    return _checked(port_number, cells[0::6], cells[1::6], pkts)
+
+
+def parse_all_info_links(scripts: str) -> RawLinks:
+    """Parse the links of the all_info layout, leaving the counters unsplit."""
+    found = _find_variables(_ALL_INFO_RE, scripts)
+    arrays = dict(_ARRAY_RE.findall(found["all_info"]))
+    return _checked_links(
+        int(found["max_port_num"]),
+        arrays["state"].split(","),
+        arrays["link_status"].split(","),
+    )
+
+
+def parse_tmp_info_links(scripts: str) -> RawLinks:
+    """Parse the links of the tmp_info layout, leaving the counters out."""
+    found = _find_variables(_TMP_INFO_RE, scripts)
+    cells = found["tmp_info"].split() + found["tmp_info2"].split()
+    return _checked_links(int(found["max_port_num"]), cells[0::6], cells[1::6])
+
+
+register_layout(
+    LAYOUT_ALL_INFO,
+    StatisticsLayout("var all_info", parse_all_info, parse_all_info_links),
+)
+register_layout(
+    LAYOUT_TMP_INFO,
+    StatisticsLayout("tmp_info", parse_tmp_info, parse_tmp_info_links),
+)
+
+
+def _find_variables(pattern: re.Pattern, scripts: str) -> dict[str, str]:
+    """Return the named groups matched in a single pass over the scripts."""
+    found: dict[str, str] = {}
+    for match in pattern.finditer(scripts):
+        found[match.lastgroup] = match.group(match.lastgroup)  # type: ignore
+    return found
+
+
+def _checked(
+    port_number: int, states: list[str], link_statuses: list[str], pkts: list[str]
+) -> RawStatistics:
+    """Return the raw statistics, raise IndexError if some ports are missing."""
+    if (
+        len(states) < port_number
+        or len(link_statuses) < port_number
+        or len(pkts) < port_number * COUNTERS_BY_PORT
+    ):
+        raise IndexError("Incomplete port statistics")
+    return port_number, states, link_statuses, pkts
+
+
+def _checked_links(
+    port_number: int, states: list[str], link_statuses: list[str]
+) -> RawLinks:
+    """Return the raw links, raise IndexError if some ports are missing."""
+    if len(states) < port_number or len(link_statuses) < port_number:
+        raise IndexError("Incomplete port links")
+    return port_number, states, link_statuses
+
+
+def _soup_parse_port_statistics(html: str) -> tuple[str, RawStatistics]:
+    """Parse statistics with BeautifulSoup, slower but tolerant."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    convoluted = soup.script == soup.head.script
+
+    if convoluted:
+        port_number = int(
+            _SOUP_MAX_PORT_NUM_RE.search(  # type: ignore
+                str(soup.head.find_all("script"))
+            ).group(2)
+        )
+    else:
+        port_number = int(
+            _SOUP_MAX_PORT_NUM_RE.search(str(soup.script)).group(2)  # type: ignore
+        )
+
+    if convoluted:
+        i1 = _SOUP_TMP_INFO_RE.search(str(soup.body.script)).group(1)  # type: ignore
+        i2 = _SOUP_TMP_INFO2_RE.search(str(soup.body.script)).group(1)  # type: ignore
+        # We simulate bug for bug the way the variables are loaded on the "normal" switch models. In those, each
+        # data array has two extra 0 cells at the end. To remain compatible with the balance of the code here,
+        # we need to add in these redundant entries so they can be removed later. (smh)
+        script_vars = (
+            "tmp_info:[" + i1.rstrip() + " " + i2.rstrip() + ",0,0]"
+        ).replace(" ", ",")
+    else:
+        script_vars = _SOUP_ALL_INFO_RE.search(str(soup.script)).group(1)  # type: ignore
+
+    entries = _SOUP_ENTRY_RE.split(script_vars)
+
+    edict = {}
+    for entry in entries:
+        e2 = re.split(":", entry)
+        edict[str(e2[0])] = _SOUP_DROP2_RE.search(e2[1]).group(1)  # type: ignore
+
+    if convoluted:
+        ee = re.split(",", edict["tmp_info"])
+        e3 = ee[0::6]
+        e4 = ee[1::6]
+        e5 = [
+            value
+            for port in range(port_number)
+            for value in ee[port * 6 + 2 : port * 6 + 6]
+        ]
+        return LAYOUT_TMP_INFO, (port_number, e3, e4, e5)
+
+    e3 = re.split(",", edict["state"])  # type: ignore
+    e4 = re.split(",", edict["link_status"])  # type: ignore
+    e5 = re.split(",", edict["pkts"])  # type: ignore
+    return LAYOUT_ALL_INFO, (port_number, e3, e4, e5)
+
+
+def build_snapshot(
+    timestamp: datetime,
+    port_number: int,
+    states: list[str],
+    link_statuses: list[str],
+    pkts: list[str],
+) -> SwitchSnapshot:
+    """Build a snapshot from the raw arrays of the page, converted once."""
+    state_values, link_values = _port_arrays(port_number, states, link_statuses)
+    counters = array("Q", map(int, pkts[: port_number * COUNTERS_BY_PORT]))
+    return SwitchSnapshot(timestamp, state_values, link_values, counters)
+
+
+def _port_arrays(
+    port_number: int, states: list[str], link_statuses: list[str]
+) -> tuple[array, array]:
+    """Convert the raw states and link statuses of the ports."""
+    state_values = array("B", map(int, states[:port_number]))
+    link_values = array("B", map(int, link_statuses[:port_number]))
+
+    if max(state_values, default=0) > max(PortState) or max(
+        link_values, default=0
+    ) > max(LinkStatus):
+        raise ValueError("Unknown port state or link status")
+
+    return state_values, link_values
+
+
+def parse_tlv_system_info(body: bytes) -> SystemInfo:
+    """Parse the system info fields of a UDP protocol answer."""
+    fields = dict(decode_fields(body))
+    return SystemInfo(
+        decode_mac(fields.get(TLV_MAC)),
+        decode_string(fields.get(TLV_FIRMWARE)),
+        decode_string(fields.get(TLV_HARDWARE)),
+    )
+
+
+def parse_tlv_port_statistics(body: bytes, timestamp: datetime) -> SwitchSnapshot:
+    """Parse the port statistics fields of a UDP protocol answer."""
+    states, link_statuses, counters = _tlv_port_arrays(body)
+    return SwitchSnapshot(timestamp, states, link_statuses, counters)
+
+
+def parse_tlv_link_states(body: bytes) -> LinkStates:
+    """Parse only the port states and link statuses of a UDP protocol answer."""
+    states, link_statuses, _ = _tlv_port_arrays(body)
+    return LinkStates(states, link_statuses)
+
+
+def _tlv_port_arrays(body: bytes) -> tuple[array, array, array]:
+    """Convert the port statistics fields, in port order."""
+    records = sorted(
+        PORT_STATISTICS.unpack(value)
+        for field_type, value in decode_fields(body)
+        if field_type == TLV_PORT_STATISTICS and len(value) == PORT_STATISTICS.size
+    )
+    if [record[0] for record in records] != list(range(1, len(records) + 1)):
+        raise ValueError("Missing port statistics")
+    state_values, link_values = _port_arrays(
+        len(records),
+        [record[1] for record in records],
+        [record[2] for record in records],
+    )
+    counters = array("Q", (value for record in records for value in record[3:]))
+    return state_values, link_values, counters
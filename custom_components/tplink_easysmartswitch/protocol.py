@@ -0,0 +1,203 @@
+"""UDP management protocol of the TP-Link Easy Smart Switches.
+
+The protocol of the Easy Smart Configuration Utility: requests are broadcast
+to UDP port 29808, switches broadcast their answers to port 29809. A packet
+is a 32 bytes header followed by type-length-value fields ending with
+PACKET_END, the whole packet obfuscated with RC4 under a fixed key. The key
+is not bundled, it is given by the user (see CONF_PROTOCOL_KEY).
+
+A session starts with a login request carrying the credentials, its answer
+gives the token of the following get requests. A get request lists the
+fields wanted, without values, the answer holds their values: one
+TLV_PORT_STATISTICS field by port for the port statistics.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import ipaddress
+import struct
+
+SWITCH_PORT = 29808
+HOST_PORT = 29809
+
+PROTOCOL_VERSION = 1
+
+OP_DISCOVERY = 0
+OP_GET = 1
+OP_SET = 2
+OP_LOGIN = 3
+OP_RETURN = 4
+
+# Field types
+TLV_MODEL = 1
+TLV_HOSTNAME = 2
+TLV_MAC = 3
+TLV_IP_ADDRESS = 4
+TLV_NETMASK = 5
+TLV_GATEWAY = 6
+TLV_FIRMWARE = 7
+TLV_HARDWARE = 8
+TLV_DHCP = 9
+TLV_PORT_NUMBER = 10
+TLV_USERNAME = 512
+TLV_PASSWORD = 514
+TLV_PORT_STATISTICS = 16384
+TLV_END = 0xFFFF
+
+ERROR_NONE = 0
+
+PACKET_END = struct.pack("!HH", TLV_END, 0)
+
+# version, op code, switch MAC, host MAC, sequence, error code, length,
+# fragment offset, flag, token, checksum
+_HEADER = struct.Struct("!BB6s6sHIHHHHI")
+_TLV = struct.Struct("!HH")
+# port, state, link status, tx good, tx bad, rx good, rx bad packets
+PORT_STATISTICS = struct.Struct("!BBBIIII")
+
+HEADER_SIZE = _HEADER.size
+
+
+class ProtocolError(Exception):
+    """Exception to indicate a malformed packet."""
+
+
+@dataclass(slots=True)
+class Packet:
+    """A packet of the protocol."""
+
+    op_code: int
+    switch_mac: bytes
+    host_mac: bytes
+    sequence: int
+    token: int = 0
+    error_code: int = 0
+    fields: list[tuple[int, bytes]] = field(default_factory=list)
+
+    def get(self, tlv_type: int) -> bytes | None:
+        """Return the first field of a type."""
+        for field_type, value in self.fields:
+            if field_type == tlv_type:
+                return value
+        return None
+
+
+def rc4(key: bytes, data: bytes) -> bytes:
+    """Encrypt or decrypt data with RC4."""
+    state = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + state[i] + key[i % len(key)]) % 256
+        state[i], state[j] = state[j], state[i]
+    out = bytearray(len(data))
+    i = j = 0
+    for position, byte in enumerate(data):
+        i = (i + 1) % 256
+        j = (j + state[i]) % 256
+        state[i], state[j] = state[j], state[i]
+        out[position] = byte ^ state[(state[i] + state[j]) % 256]
+    return bytes(out)
+
+
+def encode_packet(packet: Packet, key: bytes) -> bytes:
+    """Serialize and obfuscate a packet."""
+    body = b"".join(
+        _TLV.pack(field_type, len(value)) + value for field_type, value in packet.fields
+    )
+    body += PACKET_END
+    header = _HEADER.pack(
+        PROTOCOL_VERSION,
+        packet.op_code,
+        packet.switch_mac,
+        packet.host_mac,
+        packet.sequence,
+        packet.error_code,
+        HEADER_SIZE + len(body),
+        0,
+        0,
+        packet.token,
+        0,
+    )
+    return rc4(key, header + body)
+
+
+def decode_packet(data: bytes, key: bytes) -> Packet:
+    """Deobfuscate and parse a packet."""
+    packet, body = decrypt_packet(data, key)
+    packet.fields = decode_fields(body)
+    return packet
+
+
+def decrypt_packet(data: bytes, key: bytes) -> tuple[Packet, bytes]:
+    """Deobfuscate a packet, return its header and its undecoded fields."""
+    data = rc4(key, data)
+    if len(data) < HEADER_SIZE:
+        raise ProtocolError("Packet shorter than its header")
+    (
+        version,
+        op_code,
+        switch_mac,
+        host_mac,
+        sequence,
+        error_code,
+        length,
+        _fragment_offset,
+        _flag,
+        token,
+        _checksum,
+    ) = _HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION or not HEADER_SIZE <= length <= len(data):
+        raise ProtocolError("Not a packet of the protocol")
+    return (
+        Packet(op_code, switch_mac, host_mac, sequence, token, error_code),
+        data[HEADER_SIZE:length],
+    )
+
+
+def decode_fields(body: bytes) -> list[tuple[int, bytes]]:
+    """Parse the fields of a packet, up to PACKET_END."""
+    fields = []
+    offset = 0
+    while offset + _TLV.size <= len(body):
+        field_type, field_length = _TLV.unpack_from(body, offset)
+        offset += _TLV.size
+        if field_type == TLV_END:
+            break
+        if offset + field_length > len(body):
+            raise ProtocolError("Truncated field")
+        fields.append((field_type, body[offset : offset + field_length]))
+        offset += field_length
+    return fields
+
+
+def encode_string(value: str) -> bytes:
+    """Encode a string field, NUL terminated."""
+    return value.encode() + b"\0"
+
+
+def decode_string(value: bytes | None) -> str | None:
+    """Decode a string field."""
+    if value is None:
+        return None
+    return value.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def decode_mac(value: bytes | None) -> str | None:
+    """Decode a MAC address field in the format of the web UI."""
+    if value is None or len(value) != 6:
+        return None
+    return ":".join(f"{byte:02X}" for byte in value)
+
+
+def decode_ip(value: bytes | None) -> str | None:
+    """Decode an IPv4 address field."""
+    if value is None or len(value) != 4:
+        return None
+    return str(ipaddress.IPv4Address(value))
+
+
+def decode_int(value: bytes | None) -> int | None:
+    """Decode an unsigned integer field."""
+    if not value:
+        return None
+    return int.from_bytes(value, "big")
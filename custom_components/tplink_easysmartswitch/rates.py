@@ -0,0 +1,176 @@
+"""Per second rates of the TP-Link Easy Smart Switch counters."""
+from __future__ import annotations
+
+from array import array
+
+from .const import (
+    TPLINK_PORT_RX_BAD_PKT,
+    TPLINK_PORT_RX_GOOD_PKT,
+    TPLINK_PORT_TX_BAD_PKT,
+    TPLINK_PORT_TX_GOOD_PKT,
+)
+from .models import (
+    COUNTER_INDEX,
+    COUNTERS_BY_PORT,
+    LINK_MAX_PACKET_RATE,
+    SwitchSnapshot,
+)
+
+# Port counters are 32 bits wide and wrap around
+COUNTER_RANGE = 2**32
+
+_TX_GOOD = COUNTER_INDEX[TPLINK_PORT_TX_GOOD_PKT]
+_TX_BAD = COUNTER_INDEX[TPLINK_PORT_TX_BAD_PKT]
+_RX_GOOD = COUNTER_INDEX[TPLINK_PORT_RX_GOOD_PKT]
+_RX_BAD = COUNTER_INDEX[TPLINK_PORT_RX_BAD_PKT]
+
+
+def counter_deltas(
+    current: array, previous: array, counter_range: int = COUNTER_RANGE
+) -> list[int]:
+    """Return the increase of every counter between two snapshots.
+
+    A counter lower than its previous value has wrapped around, unless the
+    wrapped delta is implausibly large (over half the counter range): the
+    counters have then been reset and the new value is the delta.
+    """
+    half_range = counter_range // 2
+    deltas = []
+    for value, last in zip(current, previous):
+        delta = value - last
+        if delta < 0:
+            delta += counter_range
+            if delta > half_range:
+                delta = value
+        deltas.append(delta)
+    return deltas
+
+
+class CounterRates:
+    """Derive the rate of every counter of a switch between two snapshots.
+
+    Counter wraps and resets are handled by counter_deltas.
+    Rates are optionally smoothed with an exponentially weighted moving
+    average, smoothing being the weight of the newest sample (1 disables it).
+
+    The switches only count packets, so utilisation is the packet rate
+    relative to the line rate of the negotiated speed with minimum size
+    frames: the busiest direction for a port, all traffic against the
+    capacity of all linked ports for the switch. Larger frames fill the
+    link at a lower packet rate, so this is a lower bound of the bandwidth
+    used: a link saturated with 1500 byte frames reads about 5.5%.
+    The error ratio of a port is the share of bad packets in both directions.
+    """
+
+    def __init__(
+        self, smoothing: float = 1.0, counter_range: int = COUNTER_RANGE
+    ) -> None:
+        """Init the rates."""
+        self._smoothing = smoothing
+        self._counter_range = counter_range
+        self._previous: SwitchSnapshot | None = None
+        self._rates: list[float | None] = []
+        self._utilisation: list[float | None] = []
+        self._error_ratio: list[float | None] = []
+        self._switch_utilisation: float | None = None
+        self._total_rate: float | None = None
+
+    def update(self, snapshot: SwitchSnapshot) -> None:
+        """Compute the rates of all counters from a new snapshot."""
+        previous = self._previous
+        self._previous = snapshot
+
+        if previous is None or len(previous.counters) != len(snapshot.counters):
+            self._rates = [None] * len(snapshot.counters)
+            self._utilisation = [None] * snapshot.port_count
+            self._error_ratio = [None] * snapshot.port_count
+            self._switch_utilisation = None
+            self._total_rate = None
+            return
+
+        seconds = (snapshot.timestamp - previous.timestamp).total_seconds()
+        if seconds <= 0:
+            return
+
+        smoothing = self._smoothing
+        rates: list[float | None] = []
+        for delta, last_rate in zip(
+            counter_deltas(snapshot.counters, previous.counters, self._counter_range),
+            self._rates,
+        ):
+            rate = delta / seconds
+            if last_rate is not None and smoothing < 1:
+                rate = last_rate + smoothing * (rate - last_rate)
+            rates.append(rate)
+        self._rates = rates
+        self._update_ports(snapshot)
+
+    def _update_ports(self, snapshot: SwitchSnapshot) -> None:
+        """Compute the utilisation and error ratio of the ports from the rates."""
+        rates = self._rates
+        utilisation: list[float | None] = []
+        error_ratio: list[float | None] = []
+        total_rate = 0.0
+        linked_rate = 0.0
+        total_capacity = 0.0
+        for port_index, link_status in enumerate(snapshot.link_statuses):
+            capacity = LINK_MAX_PACKET_RATE.get(link_status)  # type: ignore
+            offset = port_index * COUNTERS_BY_PORT
+            tx_good, tx_bad, rx_good, rx_bad = (
+                rates[offset + _TX_GOOD],
+                rates[offset + _TX_BAD],
+                rates[offset + _RX_GOOD],
+                rates[offset + _RX_BAD],
+            )
+            if None in (tx_good, tx_bad, rx_good, rx_bad):
+                utilisation.append(None)
+                error_ratio.append(None)
+                continue
+            tx_rate = tx_good + tx_bad  # type: ignore
+            rx_rate = rx_good + rx_bad  # type: ignore
+            total = tx_rate + rx_rate
+            error_ratio.append(
+                (tx_bad + rx_bad) / total * 100 if total else 0.0  # type: ignore
+            )
+            total_rate += total
+            if capacity is None:
+                utilisation.append(None)
+                continue
+            utilisation.append(min(100.0, max(tx_rate, rx_rate) / capacity * 100))
+            linked_rate += total
+            total_capacity += 2 * capacity
+        self._utilisation = utilisation
+        self._error_ratio = error_ratio
+        self._total_rate = total_rate
+        self._switch_utilisation = (
+            min(100.0, linked_rate / total_capacity * 100) if total_capacity else None
+        )
+
+    @property
+    def total_rate(self) -> float | None:
+        """Return the packet rate of all ports in both directions."""
+        return self._total_rate
+
+    @property
+    def switch_utilisation(self) -> float | None:
+        """Return the utilisation in percent of all linked ports."""
+        return self._switch_utilisation
+
+    def utilisation(self, port: int) -> float | None:
+        """Return the utilisation in percent of a port."""
+        if port > len(self._utilisation):
+            return None
+        return self._utilisation[port - 1]
+
+    def error_ratio(self, port: int) -> float | None:
+        """Return the share in percent of bad packets of a port."""
+        if port > len(self._error_ratio):
+            return None
+        return self._error_ratio[port - 1]
+
+    def rate(self, port: int, index: int) -> float | None:
+        """Return the rate of one counter of a port, index from COUNTER_INDEX."""
+        position = (port - 1) * COUNTERS_BY_PORT + index
+        if position >= len(self._rates):
+            return None
+        return self._rates[position]
@@ -0,0 +1,190 @@
+"""Shared poller of the TP-Link Easy Smart Switches."""
+from __future__ import annotations
+
+from array import array
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+import logging
+import random
+import time
+from typing import Any, TypeVar
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import DEFAULT_MAX_CONCURRENT_POLLS
+from .models import SwitchSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# Fractional part of the golden ratio, successive multiples spread evenly on [0, 1)
+_GOLDEN_RATIO = 0.6180339887498949
+
+# Adaptive interval: growth factor while idle, and what makes a traffic spike
+BACKOFF_FACTOR = 1.5
+SPIKE_FACTOR = 2
+SPIKE_MIN_RATE = 1000
+# Packets/s by linked port below which the switch is idle: broadcast and
+# control frames keep the counters of linked ports moving
+IDLE_PORT_RATE = 10
+
+
+class SwitchPoller:
+    """Refresh the coordinators of all switches on a staggered schedule.
+
+    Each switch gets its own offset inside the scan interval so polls do not
+    fire on the same boundary, and the number of polls in flight is capped.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, max_concurrent: int = DEFAULT_MAX_CONCURRENT_POLLS
+    ) -> None:
+        """Init the poller."""
+        self._hass = hass
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._scheduled = 0
+        self._polling: set[str] = set()
+        self._latencies: dict[str, float] = {}
+
+    @property
+    def latencies(self) -> dict[str, float]:
+        """Duration in seconds of the last poll of each switch."""
+        return self._latencies
+
+    async def async_poll(self, key: str, poll: Callable[[], Awaitable[_T]]) -> _T:
+        """Run a poll once a slot is free and record its latency."""
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                return await poll()
+            finally:
+                self._latencies[key] = latency = time.monotonic() - start
+                _LOGGER.debug("Poll of %s took %.3fs", key, latency)
+
+    async def async_refresh(
+        self, key: str, coordinator: DataUpdateCoordinator[Any]
+    ) -> bool:
+        """Refresh a coordinator now, unless a refresh of key is in flight.
+
+        Return False if skipped.
+        """
+        if key in self._polling:
+            _LOGGER.debug("Previous poll of %s still running, skipping", key)
+            return False
+        self._polling.add(key)
+        try:
+            await coordinator.async_refresh()
+        finally:
+            self._polling.discard(key)
+        return True
+
+    @callback
+    def async_schedule(
+        self,
+        key: str,
+        coordinator: DataUpdateCoordinator[Any],
+        interval: Callable[[], timedelta],
+    ) -> CALLBACK_TYPE:
+        """Refresh a coordinator, interval giving the delay between two polls.
+
+        Return a callback to stop.
+        """
+        seconds = interval().total_seconds()
+        offset = (self._scheduled * _GOLDEN_RATIO + random.uniform(0, 0.05)) % 1
+        self._scheduled += 1
+        unsub: CALLBACK_TYPE | None = None
+        cancelled = False
+
+        @callback
+        def _async_schedule_next(delay: float) -> None:
+            nonlocal unsub
+            # A refresh in flight when unscheduled must not restart the chain
+            if cancelled:
+                return
+            unsub = async_call_later(self._hass, max(delay, 0), _async_start_refresh)
+
+        @callback
+        def _async_start_refresh(_now: datetime) -> None:
+            self._hass.async_create_task(_async_refresh())
+
+        async def _async_refresh() -> None:
+            start = time.monotonic()
+            await self.async_refresh(key, coordinator)
+            _async_schedule_next(
+                interval().total_seconds() - (time.monotonic() - start)
+            )
+
+        _async_schedule_next(offset * seconds)
+        _LOGGER.debug(
+            "Polling %s every %ss, offset %.1fs", key, seconds, offset * seconds
+        )
+
+        @callback
+        def _async_unschedule() -> None:
+            nonlocal cancelled, unsub
+            cancelled = True
+            if unsub is not None:
+                unsub()
+                unsub = None
+            self._latencies.pop(key, None)
+
+        return _async_unschedule
+
+
+class AdaptiveInterval:
+    """Poll interval of a switch adapted to its activity.
+
+    The interval grows while the switch is idle (no link change, and a total
+    packet rate under IDLE_PORT_RATE by linked port), goes back to the
+    minimum on a link change or a traffic spike, and otherwise returns to the
+    configured scan interval.
+    """
+
+    def __init__(self, scan_interval: float, minimum: float, maximum: float) -> None:
+        """Init the interval, in seconds."""
+        self._scan_interval = min(max(scan_interval, minimum), maximum)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._seconds = self._scan_interval
+        self._link_statuses: array | None = None
+        self._total_rate: float | None = None
+
+    @property
+    def seconds(self) -> float:
+        """Return the current interval in seconds."""
+        return self._seconds
+
+    def interval(self) -> timedelta:
+        """Return the current interval."""
+        return timedelta(seconds=self._seconds)
+
+    def update(self, snapshot: SwitchSnapshot, total_rate: float | None) -> None:
+        """Adapt the interval to a new snapshot and its total packet rate."""
+        link_changed = (
+            self._link_statuses is not None
+            and self._link_statuses != snapshot.link_statuses
+        )
+        spike = (
+            total_rate is not None
+            and self._total_rate is not None
+            and total_rate > SPIKE_MIN_RATE
+            and total_rate > self._total_rate * SPIKE_FACTOR
+        )
+        idle = total_rate is not None and total_rate < IDLE_PORT_RATE * max(
+            len(snapshot.ports_up()), 1
+        )
+        self._link_statuses = snapshot.link_statuses
+        self._total_rate = total_rate
+
+        if link_changed or spike:
+            self._seconds = self._minimum
+        elif idle:
+            self._seconds = min(self._seconds * BACKOFF_FACTOR, self._maximum)
+        elif self._seconds > self._scan_interval:
+            self._seconds = self._scan_interval
+        else:
+            self._seconds = min(self._seconds * BACKOFF_FACTOR, self._scan_interval)
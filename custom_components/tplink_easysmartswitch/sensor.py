@@ -1,26 +1,133 @@
 """Support for the TP-Link Easy Smart Switch."""
+from collections.abc import Callable
+from datetime import timedelta
 import logging
+from typing import Any
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import PERCENTAGE, UnitOfInformation, UnitOfTime
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.util import slugify
+from homeassistant.helpers.typing import StateType
+from homeassistant.util import dt as dt_util, slugify
 
-from . import get_device_info
+from .breaker import BREAKER_STATES
 from .const import (
     CONTROLLER,
     COORDINATOR,
+    DEVICE_INFO,
     DOMAIN,
-    TIMESTAMP,
+    PORT_METRIC_ERROR_RATIO,
+    PORT_METRIC_RX_ERRORS,
+    PORT_METRIC_RX_PACKETS,
+    PORT_METRIC_TX_ERRORS,
+    PORT_METRIC_TX_PACKETS,
+    PORT_METRIC_UTILISATION,
+    PORTS_UP,
+    RATES,
+    TPLINK_PORT_RX_BAD_PKT,
     TPLINK_PORT_RX_GOOD_PKT,
+    TPLINK_PORT_TX_BAD_PKT,
     TPLINK_PORT_TX_GOOD_PKT,
 )
+from .entity import (
+    TpLinkSwitchEntity,
+    async_remove_stale_entities,
+    selected_metrics,
+    selected_ports,
+)
+from .instrumentation import PollStats
+from .models import COUNTER_INDEX
+from .rates import CounterRates
 from .tplink import EasySwitch
 
 _LOGGER = logging.getLogger(__name__)
 
+SPEED_SENSOR_SUFFIXES = {
+    TPLINK_PORT_RX_GOOD_PKT: "Ingress",
+    TPLINK_PORT_TX_GOOD_PKT: "Egress",
+    TPLINK_PORT_RX_BAD_PKT: "Ingress Errors",
+    TPLINK_PORT_TX_BAD_PKT: "Egress Errors",
+}
+
+# Speed sensors of the port metrics: counter and icon
+SPEED_SENSORS = {
+    PORT_METRIC_RX_PACKETS: (TPLINK_PORT_RX_GOOD_PKT, "mdi:download-network"),
+    PORT_METRIC_TX_PACKETS: (TPLINK_PORT_TX_GOOD_PKT, "mdi:upload-network"),
+    PORT_METRIC_RX_ERRORS: (TPLINK_PORT_RX_BAD_PKT, "mdi:download-off"),
+    PORT_METRIC_TX_ERRORS: (TPLINK_PORT_TX_BAD_PKT, "mdi:upload-off"),
+}
+
+
+def _last_ms(stage: str) -> Callable[[PollStats], float | None]:
+    def _value(stats: PollStats) -> float | None:
+        record = stats.last
+        if record is None or record.error is not None:
+            return None
+        return round(getattr(record, stage) * 1000, 1)
+
+    return _value
+
+
+# Diagnostic sensors of the polls: name, unit, icon, enabled by default, value
+POLL_SENSORS: dict[str, tuple[str, str | None, str, bool, Callable]] = {
+    "poll_duration": (
+        "Poll Duration",
+        UnitOfTime.MILLISECONDS,
+        "mdi:timer-outline",
+        True,
+        _last_ms("duration"),
+    ),
+    "request_duration": (
+        "Request Duration",
+        UnitOfTime.MILLISECONDS,
+        "mdi:timer-outline",
+        False,
+        _last_ms("request_duration"),
+    ),
+    "parse_duration": (
+        "Parse Duration",
+        UnitOfTime.MILLISECONDS,
+        "mdi:timer-outline",
+        False,
+        _last_ms("parse_duration"),
+    ),
+    "payload_size": (
+        "Payload Size",
+        UnitOfInformation.BYTES,
+        "mdi:file-document-outline",
+        False,
+        lambda stats: stats.last.payload_size if stats.last else None,
+    ),
+    "poll_failures": (
+        "Poll Failures",
+        None,
+        "mdi:alert-circle-outline",
+        True,
+        lambda stats: stats.failures,
+    ),
+    "relogins": (
+        "Re-logins",
+        None,
+        "mdi:login",
+        False,
+        lambda stats: stats.relogins,
+    ),
+    "timeouts": (
+        "Timeouts",
+        None,
+        "mdi:timer-alert-outline",
+        False,
+        lambda stats: stats.timeouts,
+    ),
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
@@ -29,56 +136,101 @@ async def async_setup_entry(
     data = hass.data[DOMAIN][entry.entry_id]
     controller: EasySwitch = data[CONTROLLER]
     coordinator = data[COORDINATOR]
+    rates: CounterRates = data[RATES]
 
-    entities = []
-    ports_count = controller.port_number
-    for port in range(ports_count):
-        entities.append(
-            TpLinkSpeedSensor(
-                controller,
-                coordinator,
-                port_number=port + 1,
-                attribute=TPLINK_PORT_RX_GOOD_PKT,
-                icon="mdi:download-network",
+    device_info = data[DEVICE_INFO]
+    metrics = selected_metrics(entry)
+    ports_up: list[int] | None = data[PORTS_UP]
+
+    entities: list[TpLinkSensor] = []
+    for port in selected_ports(entry, controller.port_number):
+        # Started from the cached identity, before the first snapshot
+        enabled = None if ports_up is None else port in ports_up
+        for metric, (attribute, icon) in SPEED_SENSORS.items():
+            if metric in metrics:
+                entities.append(
+                    TpLinkSpeedSensor(
+                        controller,
+                        coordinator,
+                        rates,
+                        device_info,
+                        port_number=port,
+                        attribute=attribute,
+                        icon=icon,
+                        enabled_default=enabled,
+                    )
+                )
+        if PORT_METRIC_ERROR_RATIO in metrics:
+            entities.append(
+                TpLinkErrorRatioSensor(
+                    controller,
+                    coordinator,
+                    rates,
+                    device_info,
+                    port_number=port,
+                    enabled_default=enabled,
+                )
             )
-        )
-        entities.append(
-            TpLinkSpeedSensor(
-                controller,
-                coordinator,
-                port_number=port + 1,
-                attribute=TPLINK_PORT_TX_GOOD_PKT,
-                icon="mdi:upload-network",
+        if PORT_METRIC_UTILISATION in metrics:
+            entities.append(
+                TpLinkUtilisationSensor(
+                    controller,
+                    coordinator,
+                    rates,
+                    device_info,
+                    port_number=port,
+                    enabled_default=enabled,
+                )
             )
-        )
+    entities.append(
+        TpLinkSwitchUtilisationSensor(controller, coordinator, rates, device_info)
+    )
+    for key in POLL_SENSORS:
+        entities.append(TpLinkPollSensor(controller, coordinator, device_info, key))
+    entities.append(TpLinkBreakerSensor(controller, coordinator, device_info))
+    async_remove_stale_entities(hass, entry, "sensor", entities)
     if entities:
         async_add_entities(entities)
 
 
-class TpLinkSpeedSensor(CoordinatorEntity, SensorEntity):
+class TpLinkSensor(TpLinkSwitchEntity, SensorEntity):
+    """Base of the TP-Link Easy Smart Switch sensors, written on value change."""
+
+    _written_value: StateType = None
+
+    def _has_changed(self) -> bool:
+        """Return True if the value changed since the last write."""
+        value = self.native_value
+        if value == self._written_value:
+            return False
+        self._written_value = value
+        return True
+
+
+class TpLinkSpeedSensor(TpLinkSensor):
     """Representation of a generic TP-Link Easy Smart Switch sensor."""
 
     def __init__(
         self,
         controller,
         coordinator,
+        rates: CounterRates,
+        device_info,
         port_number,
         attribute,
         icon,
+        enabled_default: bool | None = None,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
-        self._last_value: float | None = None
-        self._last_timestamp = None
-
+        super().__init__(coordinator, port_number, device_info, enabled_default)
         self.controller = controller
-        self._port_number = port_number
+        self._rates = rates
         self._attribute = attribute
+        self._counter_index = COUNTER_INDEX[attribute]
         self._attr_native_unit_of_measurement = "packets/s"
         self._attr_icon = icon
 
-        suffix = "Ingress" if attribute == TPLINK_PORT_RX_GOOD_PKT else "Egress"
-        self._attr_name = f"Port {port_number:02} - {suffix}"
+        self._attr_name = f"Port {port_number:02} - {SPEED_SENSOR_SUFFIXES[attribute]}"
         self._attr_unique_id = slugify(
             "_".join(
                 [
@@ -90,35 +242,217 @@ class TpLinkSpeedSensor(CoordinatorEntity, SensorEntity):
                 ]
             )
         )
-        self._attr_device_info = get_device_info(self.controller)
-        self._state = None
 
-    def _has_overflowed(self, current_value) -> bool:
-        """Check if value has overflowed."""
-        return current_value < self._last_value
+    @property
+    def native_value(self) -> float | None:
+        """Return the state."""
+        rate = self._rates.rate(self._port_number, self._counter_index)
+        if rate is None:
+            return None
+        return round(rate, 2)
+
+
+class TpLinkUtilisationSensor(TpLinkSensor):
+    """Packet rate utilisation of a TP-Link Easy Smart Switch port."""
+
+    def __init__(
+        self,
+        controller,
+        coordinator,
+        rates: CounterRates,
+        device_info,
+        port_number,
+        enabled_default: bool | None = None,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, port_number, device_info, enabled_default)
+        self.controller = controller
+        self._rates = rates
+        self._attr_native_unit_of_measurement = PERCENTAGE
+        self._attr_icon = "mdi:gauge"
+
+        self._attr_name = f"Port {port_number:02} - Packet Rate Utilisation"
+        self._attr_unique_id = slugify(
+            "_".join(
+                [
+                    DOMAIN,
+                    self.controller.mac_address,
+                    "utilisation_sensor",
+                    str(port_number),
+                ]
+            )
+        )
 
     @property
     def native_value(self) -> float | None:
         """Return the state."""
-        current_value = float(self.coordinator.data[self._port_number][self._attribute])
-        if current_value is None:
+        utilisation = self._rates.utilisation(self._port_number)
+        if utilisation is None:
             return None
-        current_timestamp = self.coordinator.data[TIMESTAMP]
-        if self._last_value is None or self._has_overflowed(current_value):
-            self._last_value = current_value
-            self._last_timestamp = current_timestamp
+        return round(utilisation, 2)
+
+
+class TpLinkErrorRatioSensor(TpLinkSensor):
+    """Representation of the bad packets ratio of a TP-Link Easy Smart Switch port."""
+
+    def __init__(
+        self,
+        controller,
+        coordinator,
+        rates: CounterRates,
+        device_info,
+        port_number,
+        enabled_default: bool | None = None,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, port_number, device_info, enabled_default)
+        self.controller = controller
+        self._rates = rates
+        self._attr_native_unit_of_measurement = PERCENTAGE
+        self._attr_icon = "mdi:alert-network"
+
+        self._attr_name = f"Port {port_number:02} - Error Ratio"
+        self._attr_unique_id = slugify(
+            "_".join(
+                [
+                    DOMAIN,
+                    self.controller.mac_address,
+                    "error_ratio_sensor",
+                    str(port_number),
+                ]
+            )
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the state."""
+        error_ratio = self._rates.error_ratio(self._port_number)
+        if error_ratio is None:
             return None
+        return round(error_ratio, 2)
+
 
-        # Calculate derivative.
-        delta_value = current_value - self._last_value
-        delta_time = current_timestamp - self._last_timestamp
-        if delta_time.total_seconds() == 0:
-            # Prevent division by 0.
+class TpLinkSwitchUtilisationSensor(TpLinkSensor):
+    """Packet rate utilisation of all TP-Link Easy Smart Switch ports."""
+
+    def __init__(
+        self,
+        controller,
+        coordinator,
+        rates: CounterRates,
+        device_info,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, device_info=device_info)
+        self.controller = controller
+        self._rates = rates
+        self._attr_native_unit_of_measurement = PERCENTAGE
+        self._attr_icon = "mdi:gauge"
+
+        self._attr_name = "Packet Rate Utilisation"
+        self._attr_unique_id = slugify(
+            "_".join([DOMAIN, self.controller.mac_address, "utilisation_sensor"])
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the state."""
+        utilisation = self._rates.switch_utilisation
+        if utilisation is None:
             return None
-        derived = delta_value / delta_time.total_seconds()
+        return round(utilisation, 2)
+
+
+class TpLinkPollDiagnosticSensor(TpLinkSensor):
+    """Base of the diagnostics of the polls, written after every poll.
+
+    The coordinator does not notify its listeners of failed refreshes in a
+    row, the polls of the controller are listened to as well.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    controller: EasySwitch
 
-        # Store current values for future use.
-        self._last_value = current_value
-        self._last_timestamp = current_timestamp
+    async def async_added_to_hass(self) -> None:
+        """Listen to the polls of the controller."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.controller.add_poll_listener(self._handle_coordinator_update)
+        )
+
+    @property
+    def available(self) -> bool:
+        """Return True, failed polls are reported rather than hidden."""
+        return True
+
+
+class TpLinkPollSensor(TpLinkPollDiagnosticSensor):
+    """Representation of a diagnostic of the TP-Link Easy Smart Switch polls."""
+
+    def __init__(self, controller, coordinator, device_info, key: str) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, device_info=device_info)
+        self.controller = controller
+        name, unit, icon, enabled, self._value = POLL_SENSORS[key]
+        self._attr_native_unit_of_measurement = unit
+        self._attr_icon = icon
+        self._attr_entity_registry_enabled_default = enabled
+        self._attr_state_class = (
+            SensorStateClass.MEASUREMENT
+            if unit is not None
+            else SensorStateClass.TOTAL_INCREASING
+        )
+
+        self._attr_name = name
+        self._attr_unique_id = slugify(
+            "_".join([DOMAIN, self.controller.mac_address, "poll_sensor", key])
+        )
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the state."""
+        return self._value(self.controller.poll_stats)
+
+
+class TpLinkBreakerSensor(TpLinkPollDiagnosticSensor):
+    """State of the circuit breaker of the TP-Link Easy Smart Switch polls."""
+
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_options = BREAKER_STATES
+    _attr_icon = "mdi:electric-switch"
+
+    def __init__(self, controller, coordinator, device_info) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, device_info=device_info)
+        self.controller = controller
+        self._attr_name = "Circuit Breaker"
+        self._attr_unique_id = slugify(
+            "_".join([DOMAIN, self.controller.mac_address, "poll_sensor", "breaker"])
+        )
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the state."""
+        return self.controller.breaker.state
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the failures in a row and the next attempt while open."""
+        breaker = self.controller.breaker
+        retry_in = breaker.retry_in
+        return {
+            "consecutive_failures": breaker.failures,
+            "backoff": breaker.backoff,
+            "next_attempt": None
+            if retry_in is None
+            else (dt_util.utcnow() + timedelta(seconds=retry_in)).isoformat(),
+            "opened": breaker.opened,
+        }
 
-        return round(derived, 2)
+    def _has_changed(self) -> bool:
+        """Return True if the state or the failures in a row changed."""
+        value = (self.controller.breaker.state, self.controller.breaker.failures)
+        if value == self._written_value:
+            return False
+        self._written_value = value  # type: ignore
+        return True
@@ -0,0 +1,91 @@
+"""Services of the TP-Link Easy Smart Switch integration."""
+from __future__ import annotations
+
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import device_registry as dr
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+import voluptuous as vol
+
+from .const import DOMAIN, HISTORY, SERVICE_GET_PORT_HISTORY
+from .history import RESOLUTION_HOUR, RESOLUTIONS, CounterHistory
+
+ATTR_END = "end"
+ATTR_PORTS = "ports"
+ATTR_RESOLUTION = "resolution"
+ATTR_START = "start"
+
+GET_PORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Optional(ATTR_PORTS): vol.All(
+            cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=1))]
+        ),
+        vol.Optional(ATTR_RESOLUTION, default=RESOLUTION_HOUR): vol.In(
+            list(RESOLUTIONS)
+        ),
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+    }
+)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+
+    async def _async_get_port_history(call: ServiceCall) -> ServiceResponse:
+        """Return the counter increases of the ports of a switch by bucket."""
+        history = _history(hass, call.data[ATTR_DEVICE_ID])
+        resolution = call.data[ATTR_RESOLUTION]
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+        buckets = history.query(
+            resolution,
+            call.data.get(ATTR_PORTS),
+            dt_util.as_utc(start) if start else None,
+            dt_util.as_utc(end) if end else None,
+        )
+        return {
+            ATTR_RESOLUTION: resolution,
+            ATTR_PORTS: {
+                str(port): [
+                    {**bucket, "start": bucket["start"].isoformat()}
+                    for bucket in port_buckets
+                ]
+                for port, port_buckets in buckets.items()
+            },
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_PORT_HISTORY,
+        _async_get_port_history,
+        schema=GET_PORT_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+def _history(hass: HomeAssistant, device_id: str) -> CounterHistory:
+    """Return the counter history of the switch of a device."""
+    device = dr.async_get(hass).async_get(device_id)
+    if device is None:
+        raise HomeAssistantError(f"Unknown device {device_id}")
+    for entry_id in device.config_entries:
+        data = hass.data[DOMAIN].get(entry_id)
+        if data is None:
+            continue
+        if data.get(HISTORY) is None:
+            raise HomeAssistantError(
+                f"Counter history is not enabled for {device.name}"
+            )
+        return data[HISTORY]
+    raise HomeAssistantError(f"Device {device_id} is not a loaded switch")
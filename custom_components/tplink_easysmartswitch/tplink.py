@@ -1,27 +1,587 @@
-"""Query the TP-Link Easy Smart Switch."""
+"""Query the TP-Link Easy Smart Switch.
+
+This module, and the ones it imports, must not depend on Home Assistant: it
+also runs standalone (see scripts/poll.py).
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
 import asyncio
-import re
+from collections.abc import Callable
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import logging
+import random
 import socket
+import time
+from typing import Any, TypeVar
+import uuid
 
 import aiohttp
 import async_timeout
-from bs4 import BeautifulSoup
-
-from homeassistant.util.dt import utcnow
-
-from .const import (
-    TIMESTAMP,
-    TPLINK_PORT_LINK_STATUS,
-    TPLINK_PORT_RX_BAD_PKT,
-    TPLINK_PORT_RX_GOOD_PKT,
-    TPLINK_PORT_STATE,
-    TPLINK_PORT_TX_BAD_PKT,
-    TPLINK_PORT_TX_GOOD_PKT,
-    TPLINK_STATE,
-    TPLINK_STATUS,
+
+from .breaker import BREAKER_HALF_OPEN, PROBE_TIMEOUT, CircuitBreaker
+from .const import TRANSPORT_HTTP, TRANSPORT_UDP
+from .instrumentation import PollRecord, PollStats, timed
+from .models import LinkStates, SwitchSnapshot, SystemInfo
+from .parser import (
+    is_login_page,
+    parse_link_states,
+    parse_port_statistics,
+    parse_script_variables,
+    parse_system_info,
+    parse_tlv_link_states,
+    parse_tlv_port_statistics,
+    parse_tlv_system_info,
+)
+from .protocol import (
+    ERROR_NONE,
+    HOST_PORT,
+    OP_DISCOVERY,
+    OP_GET,
+    OP_LOGIN,
+    OP_RETURN,
+    SWITCH_PORT,
+    TLV_FIRMWARE,
+    TLV_HARDWARE,
+    TLV_MAC,
+    TLV_PASSWORD,
+    TLV_PORT_STATISTICS,
+    TLV_USERNAME,
+    Packet,
+    ProtocolError,
+    decrypt_packet,
+    encode_packet,
+    encode_string,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+PAGE_CABLE_DIAGNOSTICS = "cable_diagnostics"
+PAGE_LINK_STATES = "link_states"
+PAGE_LOOP_PREVENTION = "loop_prevention"
+PAGE_POE = "poe"
+PAGE_PORT_SETTINGS = "port_settings"
+PAGE_PORT_STATISTICS = "port_statistics"
+PAGE_SYSTEM_INFO = "system_info"
+PAGE_VLAN = "vlan"
+
+
+@dataclass(slots=True, frozen=True)
+class SwitchPage:
+    """A page of the switch web UI and its parser.
+
+    The parser must be a module level function (pages can be parsed in
+    another process), called with the page content, and the fetch time if
+    timestamped. A page is fetched at most once by refresh_interval, on
+    every request if None. If layouts, the parser is also given the firmware
+    layout of the previous page of the same path, and returns data with the
+    layout parsed. Pages with a tlv_parser can also be requested
+    over the UDP protocol: tlv_parser is called like parser with the
+    undecoded tlv_types fields of the answer.
+    """
+
+    path: str
+    parser: Callable[..., Any]
+    refresh_interval: timedelta | None = None
+    timestamped: bool = False
+    layouts: bool = False
+    tlv_types: tuple[int, ...] = ()
+    tlv_parser: Callable[..., Any] | None = None
+
+
+PAGES: dict[str, SwitchPage] = {}
+
+
+def register_page(name: str, page: SwitchPage) -> None:
+    """Register a page that EasySwitch.get_pages can fetch."""
+    PAGES[name] = page
+
+
+register_page(
+    PAGE_PORT_STATISTICS,
+    SwitchPage(
+        "PortStatisticsRpm.htm",
+        parse_port_statistics,
+        timestamped=True,
+        layouts=True,
+        tlv_types=(TLV_PORT_STATISTICS,),
+        tlv_parser=parse_tlv_port_statistics,
+    ),
+)
+# Same page, only the port states and link statuses are parsed
+register_page(
+    PAGE_LINK_STATES,
+    SwitchPage(
+        "PortStatisticsRpm.htm",
+        parse_link_states,
+        layouts=True,
+        tlv_types=(TLV_PORT_STATISTICS,),
+        tlv_parser=parse_tlv_link_states,
+    ),
+)
+register_page(
+    PAGE_SYSTEM_INFO,
+    SwitchPage(
+        "SystemInfoRpm.htm",
+        parse_system_info,
+        tlv_types=(TLV_MAC, TLV_FIRMWARE, TLV_HARDWARE),
+        tlv_parser=parse_tlv_system_info,
+    ),
+)
+register_page(
+    PAGE_PORT_SETTINGS,
+    SwitchPage("PortSettingRpm.htm", parse_script_variables, timedelta(hours=1)),
+)
+register_page(
+    PAGE_VLAN,
+    SwitchPage("Vlan8021QRpm.htm", parse_script_variables, timedelta(hours=1)),
+)
+register_page(
+    PAGE_LOOP_PREVENTION,
+    SwitchPage("LoopPreventionRpm.htm", parse_script_variables, timedelta(hours=1)),
+)
+register_page(
+    PAGE_POE,
+    SwitchPage("PoeConfigRpm.htm", parse_script_variables, timedelta(minutes=5)),
+)
+register_page(
+    PAGE_CABLE_DIAGNOSTICS,
+    SwitchPage("CableDiagRpm.htm", parse_script_variables, timedelta(days=1)),
 )
 
 
+# Keep-alive connections dropped by the switch before using force close
+KEEPALIVE_FAILURES_BEFORE_FORCE_CLOSE = 3
+
+
+@dataclass(slots=True)
+class ConnectionStats:
+    """Connection reuse statistics of a switch."""
+
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    keepalive_failures: int = 0
+    force_close: bool = False
+    connect_durations: list[float] = field(default_factory=list, repr=False)
+
+
+class SwitchTransport(ABC):
+    """How the switch is logged on and its pages requested.
+
+    Subclasses implement _login, and _request returning the raw content of a
+    page, or None if the switch asks to log in again.
+    """
+
+    name: str
+
+    def __init__(
+        self, host: str, user: str, password: str, request_timeout: float
+    ) -> None:
+        """Init the transport."""
+        self._host = host
+        self._user = user
+        self._password = password
+        self._request_timeout = request_timeout
+        self.stats = ConnectionStats()
+        self.login_count = 0
+        self.timeout_count = 0
+        self._login_lock = asyncio.Lock()
+        self._expired_login_count = -1
+
+    def supports(self, page: SwitchPage) -> bool:
+        """Return True if the transport can request the page."""
+        return True
+
+    def parser(self, page: SwitchPage) -> Callable[..., Any]:
+        """Return the parser of the page content requested by the transport."""
+        return page.parser
+
+    async def login(self) -> None:
+        """Log on the switch."""
+        await self._login()
+        self.login_count += 1
+
+    async def get(self, page: SwitchPage) -> Any:
+        """Get a page, logging in again once if the session has expired."""
+        login_count = self.login_count
+        content = await self._request(page)
+        if content is None:
+            self._expired_login_count = login_count
+            _LOGGER.debug("Session expired on %s, logging in again", self._host)
+            await self._relogin()
+            content = await self._request(page)
+            if content is None:
+                raise TpLinkSwitchInvalidAuthError("Authentication failed")
+        return content
+
+    async def _relogin(self) -> None:
+        """Log in again, once for all the requests that saw the same session expire."""
+        async with self._login_lock:
+            if self.login_count == self._expired_login_count:
+                await self.login()
+
+    @abstractmethod
+    async def _login(self) -> None:
+        """Open a session on the switch."""
+
+    @abstractmethod
+    async def _request(self, page: SwitchPage) -> Any:
+        """Get the raw content of a page, None if the session has expired."""
+
+    @abstractmethod
+    async def probe(self, timeout: float) -> None:
+        """Check that the switch answers within timeout seconds."""
+
+    async def close(self) -> None:
+        """Release the connection to the switch."""
+
+
+class HttpTransport(SwitchTransport):
+    """Log on the web UI and scrape its pages."""
+
+    name = TRANSPORT_HTTP
+
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        request_timeout: float,
+        session: aiohttp.ClientSession | None = None,
+        keepalive_timeout: float = 15.0,
+    ) -> None:
+        """Init the transport, see EasySwitch for the session."""
+        super().__init__(host, user, password, request_timeout)
+        self._url = f"http://{host}"
+        self._session = session
+        self._close_session = False
+        self._keepalive_timeout = keepalive_timeout
+        self.stats.force_close = keepalive_timeout <= 0
+
+    async def _login(self) -> None:
+        """Post the credentials to the login form."""
+        data = {"logon": "Login", "username": self._user, "password": self._password}
+        headers = {"Referer": f"{self._url}/Logout.htm"}
+
+        try:
+            async with async_timeout.timeout(self._request_timeout):
+                self.stats.requests += 1
+                response = await self._get_session().post(
+                    f"{self._url}/logon.cgi",
+                    data=data,
+                    headers=headers,
+                    timeout=self._request_timeout,
+                )
+                response.release()
+        except asyncio.TimeoutError as exception:
+            raise TpLinkSwitchCannotConnectError("Timeout error") from exception
+        except (aiohttp.ClientError, socket.gaierror) as exception:
+            raise TpLinkSwitchCannotConnectError(exception) from exception
+
+    async def _request(self, page: SwitchPage) -> str | None:
+        """Get a page, return None if the switch asks to log in.
+
+        Raise TpLinkSwitchPageError if the switch does not serve the page.
+        """
+        headers = {
+            "Referer": f"{self._url}/",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Upgrade-Insecure-Requests": "1",
+        }
+        for attempt in range(2):
+            try:
+                async with async_timeout.timeout(self._request_timeout):
+                    self.stats.requests += 1
+                    request = await self._get_session().get(
+                        f"{self._url}/{page.path}",
+                        headers=headers,
+                        timeout=self._request_timeout,
+                    )
+                    html = await request.text()
+                break
+            except asyncio.TimeoutError as exception:
+                self.timeout_count += 1
+                raise TpLinkSwitchCannotConnectError("Timeout error") from exception
+            except aiohttp.ServerDisconnectedError as exception:
+                # The switch closed a kept alive connection, retry on a new one
+                if attempt:
+                    raise TpLinkSwitchCannotConnectError(exception) from exception
+                await self._keepalive_failed()
+            except (aiohttp.ClientError, socket.gaierror) as exception:
+                raise TpLinkSwitchCannotConnectError(exception) from exception
+
+        if is_login_page(html):
+            return None
+        if request.status != 200:
+            raise TpLinkSwitchPageError(
+                f"{page.path} answered with status {request.status}"
+            )
+        return html
+
+    async def probe(self, timeout: float) -> None:
+        """Open a TCP connection to the web UI."""
+        address, _, port = self._host.partition(":")
+        try:
+            async with async_timeout.timeout(timeout):
+                _, writer = await asyncio.open_connection(
+                    address, int(port) if port else 80
+                )
+        except asyncio.TimeoutError as exception:
+            raise TpLinkSwitchCannotConnectError("Probe timeout") from exception
+        except OSError as exception:
+            raise TpLinkSwitchCannotConnectError(exception) from exception
+        writer.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the session, creating an owned one on first use."""
+        if self._session is None:
+            self._session = self._create_session()
+            self._close_session = True
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Create a session on a single, traced connection to the switch."""
+        stats = self.stats
+        trace_config = aiohttp.TraceConfig()
+
+        async def _on_connection_create_start(_session, context, _params) -> None:
+            context.start = time.monotonic()
+
+        async def _on_connection_create_end(_session, context, _params) -> None:
+            stats.connections_created += 1
+            stats.connect_durations.append(time.monotonic() - context.start)
+            del stats.connect_durations[:-100]
+
+        async def _on_connection_reuseconn(_session, _context, _params) -> None:
+            stats.connections_reused += 1
+
+        trace_config.on_connection_create_start.append(_on_connection_create_start)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(
+            limit=1,
+            force_close=stats.force_close,
+            keepalive_timeout=None if stats.force_close else self._keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+    async def _keepalive_failed(self) -> None:
+        """Count a dropped keep-alive connection, stop keep-alive if it recurs."""
+        stats = self.stats
+        stats.keepalive_failures += 1
+        if (
+            self._close_session
+            and not stats.force_close
+            and stats.keepalive_failures >= KEEPALIVE_FAILURES_BEFORE_FORCE_CLOSE
+        ):
+            _LOGGER.info(
+                "Switch %s keeps dropping kept alive connections, closing them"
+                " after each request",
+                self._host,
+            )
+            stats.force_close = True
+            session, self._session = self._session, self._create_session()
+            await session.close()  # type: ignore
+
+    async def close(self) -> None:
+        """Close the session if owned."""
+        if self._session and self._close_session:
+            await self._session.close()
+
+
+class _UdpEndpoint(asyncio.DatagramProtocol):
+    """Socket shared by the UDP transports of an event loop.
+
+    Switches broadcast their answers to HOST_PORT, the answers are matched
+    to the pending requests by sequence number.
+    """
+
+    def __init__(self, key: bytes) -> None:
+        """Init the endpoint."""
+        self._key = key
+        self._pending: dict[
+            int, tuple[bytes, asyncio.Future[tuple[Packet, bytes]]]
+        ] = {}
+        self._sequence = random.randrange(0x10000)
+        self.transport: asyncio.DatagramTransport | None = None
+        self.users = 0
+
+    def connection_made(self, transport) -> None:
+        """Keep the transport to send requests."""
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """Resolve the request answered."""
+        try:
+            packet, body = decrypt_packet(data, self._key)
+        except ProtocolError:
+            return
+        if packet.op_code != OP_RETURN or packet.sequence not in self._pending:
+            return
+        switch_mac, future = self._pending[packet.sequence]
+        # Answers are broadcast, ignore the ones of other switches
+        if switch_mac in (bytes(6), packet.switch_mac) and not future.done():
+            future.set_result((packet, body))
+
+    def error_received(self, exc: Exception) -> None:
+        """Fail the pending requests, ICMP errors can't be matched to one."""
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def request(
+        self, packet: Packet, address: tuple[str, int], timeout: float
+    ) -> tuple[Packet, bytes]:
+        """Send a request, return the answer header and undecoded fields."""
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        packet.sequence = self._sequence
+        future = asyncio.get_running_loop().create_future()
+        self._pending[packet.sequence] = (packet.switch_mac, future)
+        try:
+            async with async_timeout.timeout(timeout):
+                self.transport.sendto(  # type: ignore
+                    encode_packet(packet, self._key), address
+                )
+                return await future
+        finally:
+            del self._pending[packet.sequence]
+
+
+# Endpoints by event loop and key, being bound or bound
+_UDP_ENDPOINTS: dict[
+    tuple[asyncio.AbstractEventLoop, bytes], asyncio.Task[_UdpEndpoint]
+] = {}
+
+
+async def _open_udp_endpoint(key: bytes) -> _UdpEndpoint:
+    """Bind an endpoint on HOST_PORT, shared with the discovery."""
+    _, endpoint = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _UdpEndpoint(key),
+        local_addr=("0.0.0.0", HOST_PORT),
+        allow_broadcast=True,
+        family=socket.AF_INET,
+        reuse_port=hasattr(socket, "SO_REUSEPORT"),
+    )
+    return endpoint
+
+
+class UdpTransport(SwitchTransport):
+    """Request the fields of the UDP management protocol.
+
+    Only the pages with tlv_types are supported. The host may include a
+    port, SWITCH_PORT by default.
+    """
+
+    name = TRANSPORT_UDP
+
+    def __init__(
+        self, host: str, user: str, password: str, request_timeout: float, key: bytes
+    ) -> None:
+        """Init the transport, key is the protocol key."""
+        super().__init__(host, user, password, request_timeout)
+        address, _, port = host.partition(":")
+        self._address = (address, int(port) if port else SWITCH_PORT)
+        self._key = key
+        self._endpoint: _UdpEndpoint | None = None
+        self._switch_mac = bytes(6)
+        self._host_mac = uuid.getnode().to_bytes(6, "big")
+        self._token = 0
+
+    def supports(self, page: SwitchPage) -> bool:
+        """Return True if the page has protocol fields."""
+        return page.tlv_parser is not None
+
+    def parser(self, page: SwitchPage) -> Callable[..., Any]:
+        """Return the parser of the protocol fields."""
+        return page.tlv_parser  # type: ignore
+
+    async def _login(self) -> None:
+        """Find the switch MAC address if unknown, and open a session."""
+        if self._switch_mac == bytes(6):
+            answer, _ = await self._send(OP_DISCOVERY, [])
+            self._switch_mac = answer.switch_mac
+        answer, _ = await self._send(
+            OP_LOGIN,
+            [
+                (TLV_USERNAME, encode_string(self._user)),
+                (TLV_PASSWORD, encode_string(self._password)),
+            ],
+        )
+        if answer.error_code != ERROR_NONE:
+            raise TpLinkSwitchInvalidAuthError("Authentication failed")
+        self._token = answer.token
+
+    async def _request(self, page: SwitchPage) -> bytes | None:
+        """Get the fields of a page, return None if the session has expired."""
+        answer, body = await self._send(
+            OP_GET, [(tlv_type, b"") for tlv_type in page.tlv_types]
+        )
+        if answer.error_code != ERROR_NONE:
+            return None
+        return body
+
+    async def probe(self, timeout: float) -> None:
+        """Send a discovery request to the switch."""
+        await self._send(OP_DISCOVERY, [], timeout)
+
+    async def _send(
+        self,
+        op_code: int,
+        fields: list[tuple[int, bytes]],
+        timeout: float | None = None,
+    ) -> tuple[Packet, bytes]:
+        """Send a request to the switch, return its answer."""
+        packet = Packet(
+            op_code, self._switch_mac, self._host_mac, 0, self._token, fields=fields
+        )
+        try:
+            endpoint = await self._get_endpoint()
+            self.stats.requests += 1
+            return await endpoint.request(
+                packet, self._address, timeout or self._request_timeout
+            )
+        except asyncio.TimeoutError as exception:
+            self.timeout_count += 1
+            raise TpLinkSwitchCannotConnectError("Timeout error") from exception
+        except OSError as exception:
+            raise TpLinkSwitchCannotConnectError(exception) from exception
+
+    async def _get_endpoint(self) -> _UdpEndpoint:
+        """Return the endpoint of the loop, binding it on first use."""
+        if self._endpoint is None:
+            endpoint_key = (asyncio.get_running_loop(), self._key)
+            if (task := _UDP_ENDPOINTS.get(endpoint_key)) is None:
+                # Bound once for all the switches logging in concurrently
+                task = _UDP_ENDPOINTS[endpoint_key] = asyncio.create_task(
+                    _open_udp_endpoint(self._key)
+                )
+            try:
+                endpoint = await asyncio.shield(task)
+            except OSError:
+                _UDP_ENDPOINTS.pop(endpoint_key, None)
+                raise
+            endpoint.users += 1
+            self._endpoint = endpoint
+        return self._endpoint
+
+    async def close(self) -> None:
+        """Close the endpoint if no other switch uses it."""
+        if (endpoint := self._endpoint) is None:
+            return
+        self._endpoint = None
+        endpoint.users -= 1
+        if not endpoint.users:
+            endpoint.transport.close()  # type: ignore
+            del _UDP_ENDPOINTS[(asyncio.get_running_loop(), self._key)]
+
+
 class EasySwitch:
     """Represent a TP-Link Easy Smart Switch."""
 
@@ -32,20 +592,46 @@ class EasySwitch:
         password: str,
         request_timeout: int = 10,
         session: aiohttp.client.ClientSession = None,
+        offload_parsing: bool = True,
+        parse_executor: Executor | None = None,
+        keepalive_timeout: float = 15.0,
+        transport: str = TRANSPORT_HTTP,
+        protocol_key: bytes = b"",
     ) -> None:
-        """Init a switch."""
+        """Init a switch.
+
+        Pages are parsed in parse_executor (the loop default executor if None),
+        or directly in the event loop if offload_parsing is False.
+        Without session, the switch owns one on a single connection kept alive
+        keepalive_timeout seconds (closed after each request if 0), falling back
+        to closing connections if the switch keeps dropping them.
+        With the UDP transport, under protocol_key, the pages without protocol
+        fields are still requested over HTTP.
+        """
         self._host = host
         self._mac_address = None
         self._firmware_version = None
         self._hardware_version = None
         self._ports_count = 0
-        self._url = f"http://{host}"
-        self._user = user
-        self._password = password
+        self._last_snapshot: SwitchSnapshot | None = None
 
-        self._request_timeout = request_timeout
-        self._session = session
-        self._close_session = False
+        self._http = HttpTransport(
+            host, user, password, request_timeout, session, keepalive_timeout
+        )
+        self._transport: SwitchTransport = (
+            UdpTransport(host, user, password, request_timeout, protocol_key)
+            if transport == TRANSPORT_UDP
+            else self._http
+        )
+        self._poll_stats = PollStats()
+        self._link_poll_stats = PollStats()
+        self._offload_parsing = offload_parsing
+        self._parse_executor = parse_executor
+        self._breaker = CircuitBreaker()
+        self._pages: dict[str, Any] = {}
+        self._pages_fetched: dict[str, float] = {}
+        self._layouts: dict[str, str] = {}
+        self._poll_listeners: list[Callable[[], None]] = []
 
     @property
     def host(self) -> str:
@@ -72,150 +658,223 @@ class EasySwitch:
         """Switch's ports number."""
         return self._ports_count
 
-    async def login(self) -> bool:
-        """Log on the switch."""
-        if self._session is None:
-            self._session = aiohttp.ClientSession()
-            self._close_session = True
-
-        data = {"logon": "Login", "username": self._user, "password": self._password}
-        headers = {"Referer": f"{self._url}/Logout.htm"}
+    @property
+    def system_info(self) -> SystemInfo:
+        """Switch's identity."""
+        return SystemInfo(
+            self._mac_address, self._firmware_version, self._hardware_version
+        )
 
-        try:
-            with async_timeout.timeout(self._request_timeout):
-                await self._session.post(
-                    f"{self._url}/logon.cgi",
-                    data=data,
-                    headers=headers,
-                    timeout=self._request_timeout,
-                )
-        except asyncio.TimeoutError as exception:
-            raise TpLinkSwitchCannotConnectError("Timeout error") from exception
-        except (aiohttp.ClientError, socket.gaierror) as exception:
-            raise TpLinkSwitchCannotConnectError(exception) from exception
+    @property
+    def poll_stats(self) -> PollStats:
+        """Timings, payload sizes and failures of the last polls."""
+        return self._poll_stats
 
-        return True
+    @property
+    def link_poll_stats(self) -> PollStats:
+        """Timings, payload sizes and failures of the last link polls."""
+        return self._link_poll_stats
 
-    async def update_informations(self) -> None:
-        """Get switch information."""
-        headers = {
-            "Referer": f"{self._url}/",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Upgrade-Insecure-Requests": "1",
-        }
-        request = await self._session.get(  # type: ignore
-            f"{self._url}/SystemInfoRpm.htm",
-            headers=headers,
-            timeout=self._request_timeout,
-        )
-        soup = BeautifulSoup(await request.text(), "html.parser")
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """Circuit breaker of the polls."""
+        return self._breaker
 
-        if request.status != 200:
-            raise TpLinkSwitchInvalidAuthError("Authentication failed")
+    def add_poll_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener after each poll, failed or rejected, return a remover."""
+        self._poll_listeners.append(listener)
+        return lambda: self._poll_listeners.remove(listener)
 
-        infos = str(soup.script.string).split("\n")
-        for idx, element in enumerate(infos):
-            if "macStr" in element:
-                self._mac_address = infos[idx + 1].replace('"', "")  # type: ignore
-            elif "firmwareStr" in element:
-                self._firmware_version = infos[idx + 1].replace('"', "")  # type: ignore
-            elif "hardwareStr" in element:
-                self._hardware_version = infos[idx + 1].replace('"', "")  # type: ignore
-
-    async def get_data(self) -> dict:
-        """Get all ports data."""
-        headers = {
-            "Referer": f"{self._url}/",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Upgrade-Insecure-Requests": "1",
-        }
-        request = await self._session.get(  # type: ignore
-            f"{self._url}/PortStatisticsRpm.htm",
-            headers=headers,
-            timeout=self._request_timeout,
-        )
-        soup = BeautifulSoup(await request.text(), "html.parser")
+    @property
+    def transport(self) -> str:
+        """Name of the transport polling the switch."""
+        return self._transport.name
 
-        convoluted = soup.script == soup.head.script
+    @property
+    def connection_stats(self) -> ConnectionStats:
+        """Connection statistics of the transport, connections only counted if owned."""
+        return self._transport.stats
+
+    def restore_informations(self, infos: SystemInfo, port_number: int) -> None:
+        """Restore switch information known from a previous run."""
+        self._mac_address = infos.mac_address
+        self._firmware_version = infos.firmware_version
+        self._hardware_version = infos.hardware_version
+        self._ports_count = port_number
 
-        if request.status != 200:
-            raise TpLinkSwitchInvalidAuthError("Authentication failed")
+    async def login(self) -> bool:
+        """Log on the switch."""
+        await self._transport.login()
+        return True
 
-        pattern = re.compile(r"var (max_port_num) = (.*?);$", re.MULTILINE)
+    async def update_informations(self) -> None:
+        """Get switch information."""
+        infos: SystemInfo = await self._fetch_page(PAGE_SYSTEM_INFO)
+        self._mac_address = infos.mac_address
+        self._firmware_version = infos.firmware_version
+        self._hardware_version = infos.hardware_version
 
-        if convoluted:
-            port_number = int(
-                pattern.search(str(soup.head.find_all("script"))).group(2)  # type: ignore
-            )
-        else:
-            port_number = int(pattern.search(str(soup.script)).group(2))  # type: ignore
-        self._ports_count = port_number
+    @property
+    def layouts(self) -> dict[str, str]:
+        """Firmware layout of the pages parsed, by path."""
+        return self._layouts
 
-        if convoluted:
-            i1 = (
-                re.compile(r'tmp_info = "(.*?)";$', re.MULTILINE | re.DOTALL)  # type: ignore
-                .search(str(soup.body.script))
-                .group(1)
+    @property
+    def pages(self) -> dict[str, Any]:
+        """Last parsed data of the pages fetched by get_pages or get_data."""
+        return self._pages
+
+    async def get_data(self, *extra_pages: str) -> SwitchSnapshot:
+        """Get all ports data, and the extra pages due for refresh."""
+        snapshot: SwitchSnapshot = (
+            await self.get_pages(PAGE_PORT_STATISTICS, *extra_pages)
+        )[PAGE_PORT_STATISTICS]
+        self._ports_count = snapshot.port_count
+        snapshot.changed_ports = snapshot.changes(self._last_snapshot)
+        self._last_snapshot = snapshot
+
+        return snapshot
+
+    async def get_link_states(self) -> LinkStates:
+        """Get only the states and link statuses of the ports, a lighter poll."""
+        pages = await self._get_pages((PAGE_LINK_STATES,), self._link_poll_stats)
+        return pages[PAGE_LINK_STATES]
+
+    async def get_pages(self, *names: str) -> dict[str, Any]:
+        """Fetch concurrently the pages due for refresh, return all their data.
+
+        Only a failure of the first page fails the request. The other pages
+        failing, for instance not served by the model, are left out of the
+        result and not requested again before their refresh interval.
+        While the circuit breaker is open, fail without requesting the switch.
+        """
+        return await self._get_pages(names, self._poll_stats)
+
+    async def _get_pages(
+        self, names: tuple[str, ...], poll_stats: PollStats
+    ) -> dict[str, Any]:
+        """Fetch pages as get_pages, recording the poll in poll_stats."""
+        if not self._breaker.allow():
+            self._notify_poll_listeners()
+            raise TpLinkSwitchUnavailableError(
+                f"{self._host} unreachable, next attempt in"
+                f" {self._breaker.retry_in or 0:.0f}s"
             )
-            i2 = (
-                re.compile(r'tmp_info2 = "(.*?)";$', re.MULTILINE | re.DOTALL)  # type: ignore
-                .search(str(soup.body.script))
-                .group(1)
+        now = time.monotonic()
+        record = PollRecord(time.time(), names)
+        login_count = self._login_count()
+        timeout_count = self._timeout_count()
+        due = [
+            name
+            for name in names
+            if name not in self._pages_fetched
+            or PAGES[name].refresh_interval is None
+            or now - self._pages_fetched[name]
+            >= PAGES[name].refresh_interval.total_seconds()  # type: ignore
+        ]
+        try:
+            if self._breaker.state == BREAKER_HALF_OPEN:
+                await self._transport.probe(PROBE_TIMEOUT)
+            results = await asyncio.gather(
+                *(self._fetch_page(name, record) for name in due),
+                return_exceptions=True,
             )
-            # We simulate bug for bug the way the variables are loaded on the "normal" switch models. In those, each
-            # data array has two extra 0 cells at the end. To remain compatible with the balance of the code here,
-            # we need to add in these redundant entries so they can be removed later. (smh)
-            script_vars = (
-                "tmp_info:[" + i1.rstrip() + " " + i2.rstrip() + ",0,0]"
-            ).replace(" ", ",")
+            failures = {
+                name: result
+                for name, result in zip(due, results)
+                if isinstance(result, BaseException)
+            }
+            if (exception := failures.pop(names[0], None)) is not None:
+                raise exception
+        except TpLinkSwitchCannotConnectError as exception:
+            self._breaker.failure()
+            record.error = repr(exception)
+            raise
+        except asyncio.CancelledError:
+            self._breaker.abort()
+            raise
+        except Exception as exception:
+            # The switch answered, with an error
+            self._breaker.success()
+            record.error = repr(exception)
+            raise
         else:
-            script_vars = (
-                re.compile(r"var all_info = {\n?(.*?)\n?};$", re.MULTILINE | re.DOTALL)  # type: ignore
-                .search(str(soup.script))
-                .group(1)
+            self._breaker.success()
+        finally:
+            record.duration = time.monotonic() - now
+            record.relogins = self._login_count() - login_count
+            record.timeouts = self._timeout_count() - timeout_count
+            poll_stats.add(record)
+            self._notify_poll_listeners()
+        for name, data in zip(due, results):
+            self._pages_fetched[name] = now
+            if name in failures:
+                _LOGGER.debug("Failed to fetch %s of %s: %r", name, self._host, data)
+                self._pages.pop(name, None)
+            else:
+                self._pages[name] = data
+        return {name: self._pages[name] for name in names if name in self._pages}
+
+    async def _fetch_page(self, name: str, record: PollRecord | None = None) -> Any:
+        """Fetch and parse a registered page, recording its timings in record."""
+        page = PAGES[name]
+        transport = self._transport_for(page)
+        start = time.monotonic()
+        content = await transport.get(page)
+        request_duration = time.monotonic() - start
+        parser = transport.parser(page)
+        args: tuple[Any, ...] = (
+            (content, datetime.now(timezone.utc)) if page.timestamped else (content,)
+        )
+        layouts = page.layouts and parser is page.parser
+        if layouts:
+            args += (self._layouts.get(page.path),)
+        data, parse_duration = await self._parse(timed, parser, *args)
+        if layouts and data.layout != self._layouts.get(page.path):
+            _LOGGER.debug(
+                "%s of %s in the %s layout", page.path, self._host, data.layout
             )
-
-        entries = re.split(",?\n+", script_vars)
-
-        edict = {}
-        drop2 = re.compile(r"\[(.*),0,0]")
-        for entry in entries:
-            e2 = re.split(":", entry)
-            edict[str(e2[0])] = drop2.search(e2[1]).group(1)  # type: ignore
-
-        if convoluted:
-            e3 = {}
-            e4 = {}
-            e5 = {}
-            ee = re.split(",", edict["tmp_info"])
-            for port in range(0, port_number):
-                e3[port] = ee[(port * 6)]
-                e4[port] = ee[(port * 6) + 1]
-                e5[(port * 4)] = ee[(port * 6) + 2]
-                e5[(port * 4) + 1] = ee[(port * 6) + 3]
-                e5[(port * 4) + 2] = ee[(port * 6) + 4]
-                e5[(port * 4) + 3] = ee[(port * 6) + 5]
-        else:
-            e3 = re.split(",", edict["state"])  # type: ignore
-            e4 = re.split(",", edict["link_status"])  # type: ignore
-            e5 = re.split(",", edict["pkts"])  # type: ignore
-
-        states = {TIMESTAMP: utcnow()}
-        for port in range(1, port_number + 1):
-            states[port] = {  # type: ignore
-                TPLINK_PORT_STATE: TPLINK_STATE[e3[port - 1]],
-                TPLINK_PORT_LINK_STATUS: TPLINK_STATUS[e4[port - 1]],
-                TPLINK_PORT_TX_GOOD_PKT: e5[((port - 1) * 4)],
-                TPLINK_PORT_TX_BAD_PKT: e5[((port - 1) * 4) + 1],
-                TPLINK_PORT_RX_GOOD_PKT: e5[((port - 1) * 4) + 2],
-                TPLINK_PORT_RX_BAD_PKT: e5[((port - 1) * 4) + 3],
-            }
-        return states
+            self._layouts[page.path] = data.layout
+        if record is not None:
+            record.request_duration = max(record.request_duration, request_duration)
+            record.parse_duration += parse_duration
+            record.payload_size += len(content)
+        return data
+
+    def _notify_poll_listeners(self) -> None:
+        """Call the poll listeners."""
+        for listener in list(self._poll_listeners):
+            listener()
+
+    def _transport_for(self, page: SwitchPage) -> SwitchTransport:
+        """Return the transport of a page, HTTP if the selected one lacks it."""
+        return self._transport if self._transport.supports(page) else self._http
+
+    def _login_count(self) -> int:
+        """Return the logins of all transports."""
+        if self._transport is self._http:
+            return self._http.login_count
+        return self._transport.login_count + self._http.login_count
+
+    def _timeout_count(self) -> int:
+        """Return the timeouts of all transports."""
+        if self._transport is self._http:
+            return self._http.timeout_count
+        return self._transport.timeout_count + self._http.timeout_count
+
+    async def _parse(self, parser: Callable[..., _T], *args: Any) -> _T:
+        """Run a parser out of the event loop, unless disabled."""
+        if not self._offload_parsing:
+            return parser(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._parse_executor, parser, *args
+        )
 
     async def close(self) -> None:
-        """Close open client session."""
-        if self._session and self._close_session:
-            await self._session.close()
+        """Close the connections to the switch."""
+        await self._http.close()
+        if self._transport is not self._http:
+            await self._transport.close()
 
     async def __aenter__(self):
         """Async enter."""
@@ -230,5 +889,13 @@ class TpLinkSwitchCannotConnectError(Exception):
     """Exception to indicate an error in connection."""
 
 
+class TpLinkSwitchUnavailableError(TpLinkSwitchCannotConnectError):
+    """Exception to indicate a switch not requested, its breaker being open."""
+
+
+class TpLinkSwitchPageError(TpLinkSwitchCannotConnectError):
+    """Exception to indicate a page not served by the switch."""
+
+
 class TpLinkSwitchInvalidAuthError(Exception):
     """Exception to indicate an error in authentication."""
@@ -0,0 +1,17 @@
+"""Load the integration modules without importing Home Assistant."""
+import importlib
+from pathlib import Path
+import sys
+import types
+
+PACKAGE = "tplink_easysmartswitch"
+COMPONENT_DIR = Path(__file__).resolve().parent.parent / "custom_components" / PACKAGE
+
+
+def load(module: str) -> types.ModuleType:
+    """Import a module of the integration, skipping its package __init__."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(COMPONENT_DIR)]  # type: ignore
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{module}")
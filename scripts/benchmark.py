@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Benchmark EasySwitch polling against emulated switches.
+
+For each switch count, emulated switches are started in a separate process
+(see emulator.py), then all of them are polled concurrently in a loop for
+--duration seconds. Polls/s, client CPU time by poll and poll latency
+percentiles are reported.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from _component import load
+
+EMULATOR = Path(__file__).resolve().parent / "emulator.py"
+
+
+async def run(args: argparse.Namespace, switch_count: int) -> None:
+    """Benchmark a number of switches."""
+    tplink = load("tplink")
+
+    emulator = subprocess.Popen(
+        [
+            sys.executable,
+            str(EMULATOR),
+            f"--switches={switch_count}",
+            f"--base-port={args.base_port}",
+            f"--ports={args.ports}",
+            f"--latency={args.latency}",
+            f"--session-timeout={args.session_timeout}",
+        ]
+        + ([f"--layout={args.layout}"] if args.layout else [])
+        + (["--udp", f"--key={args.key}"] if args.udp else []),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        emulator.stdout.readline()  # type: ignore
+
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            switches = [
+                tplink.EasySwitch(
+                    f"127.0.0.1:{args.base_port + index}",
+                    "admin",
+                    "admin",
+                    session=None if args.dedicated else session,
+                    offload_parsing=not args.inline,
+                    transport="udp" if args.udp else "http",
+                    protocol_key=args.key.encode(),
+                )
+                for index in range(switch_count)
+            ]
+            await asyncio.gather(*(switch.login() for switch in switches))
+
+            latencies: list[float] = []
+
+            async def poll(switch) -> None:
+                start = time.perf_counter()
+                await switch.get_data()
+                latencies.append(time.perf_counter() - start)
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            while time.perf_counter() - wall_start < args.duration:
+                await asyncio.gather(*(poll(switch) for switch in switches))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            await asyncio.gather(*(switch.close() for switch in switches))
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{switch_count:>8} {len(latencies) / wall:>10.1f}"
+        f" {cpu / len(latencies) * 1000:>12.3f}"
+        f" {quantiles[49] * 1000:>9.1f} {quantiles[94] * 1000:>9.1f}"
+        f" {quantiles[98] * 1000:>9.1f}"
+    )
+    if args.dedicated:
+        created = sum(
+            switch.connection_stats.connections_created for switch in switches
+        )
+        reused = sum(switch.connection_stats.connections_reused for switch in switches)
+        print(f"{'':>8} connections created {created}, reused {reused}")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--switches",
+        default="1,10,50,200",
+        help="comma separated switch counts",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--base-port", type=int, default=18080)
+    parser.add_argument("--ports", type=int, default=24, help="ports by switch")
+    parser.add_argument("--layout", choices=("all_info", "tmp_info"))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--session-timeout", type=float, default=600.0, help="seconds")
+    parser.add_argument(
+        "--dedicated", action="store_true", help="one kept alive connection by switch"
+    )
+    parser.add_argument("--inline", action="store_true", help="parse in the event loop")
+    parser.add_argument(
+        "--udp", action="store_true", help="poll with the UDP management protocol"
+    )
+    parser.add_argument("--key", default="benchmark", help="key of the UDP protocol")
+    args = parser.parse_args()
+
+    print(
+        f"{'switches':>8} {'polls/s':>10} {'cpu ms/poll':>12}"
+        f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for switch_count in (int(count) for count in args.switches.split(",")):
+        asyncio.run(run(args, switch_count))
+
+
+if __name__ == "__main__":
+    main()
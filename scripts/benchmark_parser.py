@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Compare the statistics parsers: layout known, layout detected, BeautifulSoup.
+
+Usage: benchmark_parser.py [--number N] [page.htm ...]
+
+The layout is known once detected on a previous page of the switch, and only
+detected again if a page is not in it.
+
+Without page arguments, 8, 24 and 48 ports pages are generated in both
+firmware layouts.
+"""
+import argparse
+from pathlib import Path
+import timeit
+
+from _component import load
+import sample_pages
+
+
+def main() -> None:
+    """Run the benchmark."""
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument("pages", nargs="*", type=Path)
+    args_parser.add_argument("--number", type=int, default=200)
+    args = args_parser.parse_args()
+
+    parser = load("parser")
+
+    if args.pages:
+        pages = {path.name: path.read_text() for path in args.pages}
+    else:
+        pages = {
+            f"{layout} {count} ports": sample_pages.port_statistics_page(
+                layout, sample_pages.random_ports(count)
+            )
+            for layout in (sample_pages.ALL_INFO, sample_pages.TMP_INFO)
+            for count in (8, 24, 48)
+        }
+
+    print(
+        f"{'page':<24} {'layout':<9} {'known (µs)':>11} {'detect (µs)':>12}"
+        f" {'soup (µs)':>10} {'speedup':>8}"
+    )
+    for name, html in pages.items():
+        layout, raw = parser._parse_statistics(html, None)
+        soup_layout, soup_raw = parser._soup_parse_port_statistics(html)
+        fast_snapshot = parser.build_snapshot(None, *raw)
+        soup_snapshot = parser.build_snapshot(None, *soup_raw)
+        if layout != soup_layout or [
+            fast_snapshot.port(port) for port in range(1, fast_snapshot.port_count + 1)
+        ] != [
+            soup_snapshot.port(port) for port in range(1, soup_snapshot.port_count + 1)
+        ]:
+            print(f"{name:<24} parsers disagree")
+            continue
+        known = timeit.timeit(
+            lambda: parser._parse_statistics(html, layout), number=args.number
+        )
+        # Detection from the other layout, as after a firmware upgrade
+        other = next(other for other in parser.LAYOUTS if other != layout)
+        detect = timeit.timeit(
+            lambda: parser._parse_statistics(html, other), number=args.number
+        )
+        soup = timeit.timeit(
+            lambda: parser._soup_parse_port_statistics(html), number=args.number
+        )
+        print(
+            f"{name:<24} {layout:<9} {known / args.number * 1e6:>11.1f}"
+            f" {detect / args.number * 1e6:>12.1f}"
+            f" {soup / args.number * 1e6:>10.1f} {soup / known:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Emulate the web UI of TP-Link Easy Smart Switches.
+
+Each emulated switch listens on its own TCP port, starting at --base-port,
+and serves logon.cgi, SystemInfoRpm.htm and PortStatisticsRpm.htm.
+With --discovery-port, all of them also answer the UDP discovery requests
+on that port, to the requesting address, obfuscated with --key. With --udp,
+each switch also answers the UDP management protocol on the UDP port of the
+same number as its TCP port.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from functools import partial
+import itertools
+import random
+import time
+
+from aiohttp import web
+
+from _component import load
+import sample_pages
+
+LAYOUTS = (sample_pages.ALL_INFO, sample_pages.TMP_INFO)
+
+
+class SwitchEmulator:
+    """A single emulated switch."""
+
+    def __init__(
+        self,
+        index: int,
+        port_count: int = 8,
+        layout: str = sample_pages.ALL_INFO,
+        latency: float = 0.0,
+        session_timeout: float = 600.0,
+        username: str = "admin",
+        password: str = "admin",
+    ) -> None:
+        """Init the switch, with random link statuses and traffic."""
+        rand = random.Random(index)
+        self.layout = layout
+        self.latency = latency
+        self.session_timeout = session_timeout
+        self.username = username
+        self.password = password
+        self.mac_address = ":".join(
+            f"{byte:02X}" for byte in (0x50, 0xC7, 0xBF, index >> 16, index >> 8, index)
+        )
+        self._sessions: dict[str, float] = {}
+        self._tokens: dict[int, float] = {}
+        self._start = time.monotonic()
+        self._ports = sample_pages.random_ports(port_count, seed=index)
+        # Packets/s by port of the 4 counters, 0 for ports without link
+        self._rates = [
+            (
+                rand.randrange(20000),
+                rand.randrange(2),
+                rand.randrange(20000),
+                rand.randrange(2),
+            )
+            if port[1]
+            else (0, 0, 0, 0)
+            for port in self._ports
+        ]
+
+    def discovery_answer(self, request, host: str, port: int):
+        """Return the answer to a discovery request packet."""
+        protocol = load("protocol")
+        mac = bytes.fromhex(self.mac_address.replace(":", ""))
+        return protocol.Packet(
+            protocol.OP_RETURN,
+            mac,
+            request.host_mac,
+            request.sequence,
+            fields=[
+                (protocol.TLV_MODEL, protocol.encode_string("TL-SG1024DE")),
+                (protocol.TLV_HOSTNAME, protocol.encode_string(f"{host}:{port}")),
+                (protocol.TLV_MAC, mac),
+                (protocol.TLV_IP_ADDRESS, bytes(map(int, host.split(".")))),
+                (
+                    protocol.TLV_FIRMWARE,
+                    protocol.encode_string("1.0.0 Build 20230218 Rel.50633"),
+                ),
+                (protocol.TLV_HARDWARE, protocol.encode_string("TL-SG1024DE 4.0")),
+                (protocol.TLV_PORT_NUMBER, bytes([len(self._ports)])),
+            ],
+        )
+
+    def udp_answer(self, request):
+        """Return the answer to a login or get request packet."""
+        protocol = load("protocol")
+        mac = bytes.fromhex(self.mac_address.replace(":", ""))
+        answer = protocol.Packet(
+            protocol.OP_RETURN, mac, request.host_mac, request.sequence
+        )
+        if request.op_code == protocol.OP_LOGIN:
+            if (
+                protocol.decode_string(request.get(protocol.TLV_USERNAME))
+                == self.username
+                and protocol.decode_string(request.get(protocol.TLV_PASSWORD))
+                == self.password
+            ):
+                answer.token = random.randrange(1, 0x10000)
+                self._tokens[answer.token] = time.monotonic() + self.session_timeout
+            else:
+                answer.error_code = 1
+            return answer
+
+        if self._tokens.get(request.token, 0.0) <= time.monotonic():
+            answer.error_code = 1
+            return answer
+        for field_type, _ in request.fields:
+            if field_type == protocol.TLV_PORT_STATISTICS:
+                answer.fields.extend(
+                    (field_type, protocol.PORT_STATISTICS.pack(number, *port))
+                    for number, port in enumerate(self._ports_now(), start=1)
+                )
+            elif field_type == protocol.TLV_MAC:
+                answer.fields.append((field_type, mac))
+            elif field_type == protocol.TLV_FIRMWARE:
+                answer.fields.append(
+                    (
+                        field_type,
+                        protocol.encode_string("1.0.0 Build 20230218 Rel.50633"),
+                    )
+                )
+            elif field_type == protocol.TLV_HARDWARE:
+                answer.fields.append(
+                    (field_type, protocol.encode_string("TL-SG1024DE 4.0"))
+                )
+        return answer
+
+    def application(self) -> web.Application:
+        """Return the web application of the switch."""
+        app = web.Application()
+        app.router.add_post("/logon.cgi", self._logon)
+        app.router.add_get("/SystemInfoRpm.htm", self._system_info)
+        app.router.add_get("/PortStatisticsRpm.htm", self._port_statistics)
+        return app
+
+    def expire_sessions(self) -> None:
+        """Log out all clients."""
+        self._sessions.clear()
+        self._tokens.clear()
+
+    def _logged_in(self, request: web.Request) -> bool:
+        expiry = self._sessions.get(request.remote or "")
+        return expiry is not None and expiry > time.monotonic()
+
+    def _ports_now(self) -> list[tuple[int, ...]]:
+        elapsed = time.monotonic() - self._start
+        return [
+            (
+                state,
+                link,
+                *(
+                    (counter + int(rate * elapsed)) % 2**32
+                    for counter, rate in zip(counters, rates)
+                ),
+            )
+            for (state, link, *counters), rates in zip(self._ports, self._rates)
+        ]
+
+    async def _logon(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        data = await request.post()
+        if (
+            data.get("username") == self.username
+            and data.get("password") == self.password
+        ):
+            self._sessions[request.remote or ""] = (
+                time.monotonic() + self.session_timeout
+            )
+        return web.Response(text=sample_pages.login_page(), content_type="text/html")
+
+    async def _system_info(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        if not self._logged_in(request):
+            return web.Response(
+                text=sample_pages.login_page(), content_type="text/html"
+            )
+        return web.Response(
+            text=sample_pages.system_info_page(
+                self.mac_address, "1.0.0 Build 20230218 Rel.50633", "TL-SG1024DE 4.0"
+            ),
+            content_type="text/html",
+        )
+
+    async def _port_statistics(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        if not self._logged_in(request):
+            return web.Response(
+                text=sample_pages.login_page(), content_type="text/html"
+            )
+        return web.Response(
+            text=sample_pages.port_statistics_page(self.layout, self._ports_now()),
+            content_type="text/html",
+        )
+
+
+class UdpResponder(asyncio.DatagramProtocol):
+    """Answer the UDP requests for emulated switches.
+
+    Discovery requests are answered by all the switches, the other requests
+    by the switch they are addressed to.
+    """
+
+    def __init__(
+        self, switches: list[tuple[SwitchEmulator, str, int]], key: bytes
+    ) -> None:
+        """Init with the switches and their HTTP address."""
+        self._switches = switches
+        self._key = key
+        self._transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport) -> None:
+        """Keep the transport to answer."""
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        """Answer a request after the latency of the switches."""
+        protocol = load("protocol")
+        try:
+            request = protocol.decode_packet(data, self._key)
+        except protocol.ProtocolError:
+            return
+        answers = []
+        for emulator, host, port in self._switches:
+            if request.op_code == protocol.OP_DISCOVERY:
+                answers.append(emulator.discovery_answer(request, host, port))
+            elif request.switch_mac.hex(":").upper() == emulator.mac_address:
+                answers.append(emulator.udp_answer(request))
+        for answer in answers:
+            asyncio.get_running_loop().call_later(
+                self._switches[0][0].latency,
+                self._transport.sendto,  # type: ignore
+                protocol.encode_packet(answer, self._key),
+                addr,
+            )
+
+
+async def start_emulators(
+    count: int,
+    base_port: int,
+    host: str = "127.0.0.1",
+    layout: str | None = None,
+    discovery_port: int | None = None,
+    key: bytes = b"",
+    udp: bool = False,
+    **kwargs,
+) -> tuple[list[SwitchEmulator], list[web.AppRunner]]:
+    """Start emulated switches on consecutive ports, alternating layouts if None.
+
+    The switches answer discovery requests on discovery_port, if given, and
+    the UDP management protocol on their own port if udp.
+    """
+    emulators = []
+    runners = []
+    layouts = itertools.cycle([layout] if layout else LAYOUTS)
+    for index in range(count):
+        emulator = SwitchEmulator(index, layout=next(layouts), **kwargs)
+        runner = web.AppRunner(emulator.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, base_port + index).start()
+        if udp:
+            await asyncio.get_running_loop().create_datagram_endpoint(
+                partial(UdpResponder, [(emulator, host, base_port + index)], key),
+                local_addr=(host, base_port + index),
+            )
+        emulators.append(emulator)
+        runners.append(runner)
+    if discovery_port is not None:
+        await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: UdpResponder(
+                [
+                    (emulator, host, base_port + index)
+                    for index, emulator in enumerate(emulators)
+                ],
+                key,
+            ),
+            local_addr=(host, discovery_port),
+        )
+    return emulators, runners
+
+
+async def main() -> None:
+    """Run the emulators until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--switches", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8080)
+    parser.add_argument("--ports", type=int, default=8, help="ports by switch")
+    parser.add_argument("--layout", choices=LAYOUTS, help="default: alternate")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--session-timeout", type=float, default=600.0)
+    parser.add_argument("--discovery-port", type=int, help="UDP, e.g. 29808")
+    parser.add_argument("--key", default="", help="key of the UDP protocol")
+    parser.add_argument("--udp", action="store_true", help="answer the UDP protocol")
+    args = parser.parse_args()
+
+    _, runners = await start_emulators(
+        args.switches,
+        args.base_port,
+        host=args.host,
+        layout=args.layout,
+        port_count=args.ports,
+        latency=args.latency,
+        session_timeout=args.session_timeout,
+        discovery_port=args.discovery_port,
+        key=args.key.encode(),
+        udp=args.udp,
+    )
+    print(
+        f"{args.switches} switches listening on {args.host}:"
+        f"{args.base_port}-{args.base_port + args.switches - 1}",
+        flush=True,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Poll TP-Link Easy Smart Switches without Home Assistant.
+
+All switches are polled concurrently every --interval seconds, each poll is
+written to stdout (or --output) as it completes, one JSON object by switch
+(ndjson) or one row by port (csv). Throughput and latency percentiles are
+reported on stderr at the end.
+
+Switches are given as host[:port] arguments or in --file, one by line,
+optionally followed by a username and a password overriding the defaults.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+from pathlib import Path
+import statistics
+import sys
+import time
+from typing import Any, TextIO
+
+from _component import load
+
+CSV_FIELDS = (
+    "timestamp",
+    "host",
+    "port",
+    "state",
+    "link_status",
+    "tx_good",
+    "tx_bad",
+    "rx_good",
+    "rx_bad",
+)
+
+
+class Writer:
+    """Write the polls in NDJSON or CSV."""
+
+    def __init__(self, output: TextIO, output_format: str) -> None:
+        """Init the writer, writing the CSV header."""
+        self._output = output
+        self._csv = (
+            csv.DictWriter(output, CSV_FIELDS) if output_format == "csv" else None
+        )
+        if self._csv:
+            self._csv.writeheader()
+
+    def write(self, host: str, snapshot) -> None:
+        """Write a snapshot of a switch."""
+        timestamp = snapshot.timestamp.isoformat()
+        ports = [
+            {
+                "port": port,
+                "state": str(stats.state),
+                "link_status": str(stats.link_status),
+                "tx_good": stats.tx_good,
+                "tx_bad": stats.tx_bad,
+                "rx_good": stats.rx_good,
+                "rx_bad": stats.rx_bad,
+            }
+            for port, stats in (
+                (port, snapshot.port(port))
+                for port in range(1, snapshot.port_count + 1)
+            )
+        ]
+        if self._csv:
+            self._csv.writerows(
+                {"timestamp": timestamp, "host": host, **port} for port in ports
+            )
+        else:
+            self._output.write(
+                json.dumps({"timestamp": timestamp, "host": host, "ports": ports})
+                + "\n"
+            )
+        self._output.flush()
+
+    def write_error(self, host: str, error: Exception) -> None:
+        """Write a failed poll, in NDJSON only."""
+        if self._csv:
+            return
+        self._output.write(json.dumps({"host": host, "error": str(error)}) + "\n")
+        self._output.flush()
+
+
+def read_switches(args: argparse.Namespace) -> list[tuple[str, str, str]]:
+    """Return the host, username and password of the switches."""
+    switches = [(host, args.username, args.password) for host in args.switches]
+    if args.file:
+        for line in args.file.read_text().splitlines():
+            fields = line.split("#", 1)[0].split()
+            if fields:
+                host, username, password = (
+                    fields + [args.username, args.password][len(fields) - 1 :]
+                )[:3]
+                switches.append((host, username, password))
+    return switches
+
+
+async def poll_switch(
+    switch,
+    writer: Writer,
+    latencies: list[float],
+    args: argparse.Namespace,
+    stop: float,
+) -> int:
+    """Poll a switch until stop or --count polls, return the failures."""
+    tplink = load("tplink")
+    failures = 0
+    polls = 0
+    while time.monotonic() < stop and (not args.count or polls < args.count):
+        start = time.monotonic()
+        try:
+            snapshot = await switch.get_data()
+        except (
+            tplink.TpLinkSwitchCannotConnectError,
+            tplink.TpLinkSwitchInvalidAuthError,
+        ) as error:
+            failures += 1
+            writer.write_error(switch.host, error)
+        else:
+            latencies.append(time.monotonic() - start)
+            writer.write(switch.host, snapshot)
+        polls += 1
+        await asyncio.sleep(max(0.0, args.interval - (time.monotonic() - start)))
+    return failures
+
+
+def report(latencies: list[float], failures: int, wall: float) -> dict[str, Any]:
+    """Return throughput and latency percentiles in milliseconds."""
+    result: dict[str, Any] = {
+        "polls": len(latencies) + failures,
+        "failures": failures,
+        "polls_per_second": round(len(latencies) / wall, 1) if wall else None,
+    }
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        result.update(
+            p50_ms=round(quantiles[49] * 1000, 1),
+            p95_ms=round(quantiles[94] * 1000, 1),
+            p99_ms=round(quantiles[98] * 1000, 1),
+        )
+    return result
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Poll all switches."""
+    tplink = load("tplink")
+    switches = [
+        tplink.EasySwitch(
+            host,
+            username,
+            password,
+            request_timeout=args.timeout,
+            offload_parsing=not args.inline,
+            transport=args.transport,
+            protocol_key=args.key.encode(),
+        )
+        for host, username, password in read_switches(args)
+    ]
+    if not switches:
+        raise SystemExit("No switch to poll")
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = Writer(output, args.format)
+    latencies: list[float] = []
+    wall_start = time.monotonic()
+    stop = wall_start + args.duration if args.duration else float("inf")
+    try:
+        failures = await asyncio.gather(
+            *(poll_switch(switch, writer, latencies, args, stop) for switch in switches)
+        )
+    finally:
+        await asyncio.gather(*(switch.close() for switch in switches))
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        json.dumps(report(latencies, sum(failures), time.monotonic() - wall_start)),
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    """Parse the arguments and poll."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog="\n".join(__doc__.splitlines()[2:]),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("switches", nargs="*", metavar="host[:port]")
+    parser.add_argument("--file", type=Path, help="switches, one by line")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds")
+    parser.add_argument("--count", type=int, default=0, help="polls by switch")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--output", help="file, default: stdout")
+    parser.add_argument("--inline", action="store_true", help="parse in the event loop")
+    parser.add_argument("--transport", choices=("http", "udp"), default="http")
+    parser.add_argument("--key", default="", help="key of the UDP protocol")
+    args = parser.parse_args()
+    if not args.count and not args.duration:
+        args.count = 1
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Build the pages served by the switch firmwares."""
+import random
+
+ALL_INFO = "all_info"
+TMP_INFO = "tmp_info"
+
+
+def random_ports(
+    port_count: int, seed: int = 0
+) -> list[tuple[int, int, int, int, int, int]]:
+    """Return (state, link_status, tx_good, tx_bad, rx_good, rx_bad) by port."""
+    rand = random.Random(seed)
+    return [
+        (
+            1,
+            rand.choice((0, 5, 6)),
+            rand.randrange(2**32),
+            rand.randrange(100),
+            rand.randrange(2**32),
+            rand.randrange(100),
+        )
+        for _ in range(port_count)
+    ]
+
+
+def login_page() -> str:
+    """Render the login page, also served when the session has expired."""
+    return """<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+</head>
+<body>
+<form name="logon" method="post" action="/logon.cgi">
+<input type="text" name="username">
+<input type="password" name="password">
+<input type="submit" name="logon" value="Login">
+</form>
+</body>
+</html>
+"""
+
+
+def system_info_page(mac_address: str, firmware: str, hardware: str) -> str:
+    """Render SystemInfoRpm.htm."""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+</head>
+<body>
+<script type="text/javascript">
+var info_ds = {{
+descriStr:[
+"TL-SG1024DE"
+],
+macStr:[
+"{mac_address}"
+],
+ipStr:[
+"192.168.0.1"
+],
+netmaskStr:[
+"255.255.255.0"
+],
+gatewayStr:[
+"192.168.0.254"
+],
+firmwareStr:[
+"{firmware}"
+],
+hardwareStr:[
+"{hardware}"
+]
+}};
+</script>
+</body>
+</html>
+"""
+
+
+def port_statistics_page(layout: str, ports: list) -> str:
+    """Render the statistics page in the given firmware layout."""
+    if layout == TMP_INFO:
+        return _tmp_info_page(ports)
+    return _all_info_page(ports)
+
+
+def _all_info_page(ports: list) -> str:
+    state = ",".join(str(port[0]) for port in ports)
+    link_status = ",".join(str(port[1]) for port in ports)
+    pkts = ",".join(str(value) for port in ports for value in port[2:])
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<link rel="stylesheet" href="/style.css" type="text/css">
+</head>
+<body>
+<script type="text/javascript">
+var max_port_num = {len(ports)};
+var port_middle_num  = 16;
+var all_info = {{
+state:[{state},0,0],
+link_status:[{link_status},0,0],
+pkts:[{pkts},0,0]
+}};
+var tip = "";
+</script>
+<form name="port_statistics">
+<table id="statistics_table">
+{_table_rows(ports)}
+</table>
+</form>
+</body>
+</html>
+"""
+
+
+def _tmp_info_page(ports: list) -> str:
+    half = (len(ports) + 1) // 2
+    tmp_info = " ".join(str(value) for port in ports[:half] for value in port)
+    tmp_info2 = " ".join(str(value) for port in ports[half:] for value in port)
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<script type="text/javascript">
+var max_port_num = {len(ports)};
+var port_middle_num  = 16;
+</script>
+</head>
+<body>
+<script type="text/javascript">
+var tmp_info = "{tmp_info} ";
+var tmp_info2 = "{tmp_info2} ";
+</script>
+<form name="port_statistics">
+<table id="statistics_table">
+{_table_rows(ports)}
+</table>
+</form>
+</body>
+</html>
+"""
+
+
+def _table_rows(ports: list) -> str:
+    return "\n".join(
+        f"<tr><td>Port {idx}</td>"
+        + "".join(f"<td>{value}</td>" for value in port)
+        + "</tr>"
+        for idx, port in enumerate(ports, 1)
+    )
@@ -0,0 +1,58 @@
+"""Tests of the adaptive poll interval."""
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+# pylint: disable=wrong-import-position
+from custom_components.tplink_easysmartswitch.models import (  # noqa: E402
+    COUNTERS_BY_PORT,
+    LinkStatus,
+    PortState,
+    SwitchSnapshot,
+)
+from custom_components.tplink_easysmartswitch.rates import CounterRates  # noqa: E402
+from custom_components.tplink_easysmartswitch.scheduler import (  # noqa: E402
+    AdaptiveInterval,
+)
+
+PORTS = 8
+LINKED = (LinkStatus.FULL_1000M, LinkStatus.FULL_100M) + (LinkStatus.LINK_DOWN,) * 6
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _snapshot(seconds: float, packets: int) -> SwitchSnapshot:
+    """Return a snapshot with packets received so far on the first port."""
+    counters = array("Q", [0] * PORTS * COUNTERS_BY_PORT)
+    counters[2] = packets
+    return SwitchSnapshot(
+        START + timedelta(seconds=seconds),
+        array("B", [PortState.ENABLED] * PORTS),
+        array("B", LINKED),
+        counters,
+    )
+
+
+def _run(rate: float, polls: int) -> AdaptiveInterval:
+    """Poll a switch receiving rate packets/s, following the interval."""
+    interval = AdaptiveInterval(30, 10, 300)
+    rates = CounterRates()
+    seconds = 0.0
+    for _ in range(polls):
+        snapshot = _snapshot(seconds, int(seconds * rate))
+        rates.update(snapshot)
+        interval.update(snapshot, rates.total_rate)
+        seconds += interval.seconds
+    return interval
+
+
+def test_slow_traffic_backs_off() -> None:
+    """A switch seeing only a little broadcast traffic is polled less often."""
+    assert _run(0.17, 20).seconds == 300
+
+
+def test_busy_switch_keeps_scan_interval() -> None:
+    """A switch with traffic is polled at the scan interval."""
+    assert _run(5000, 20).seconds == 30